@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_journal_project.settings')
+
+app = Celery('book_journal_project')
+
+# read CELERY_* settings from django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
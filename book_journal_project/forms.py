@@ -62,7 +62,9 @@ class LoginForm(AuthenticationForm):
 class BookSearchForm(forms.Form):
     query = forms.CharField(label='', max_length=200, widget=forms.TextInput(attrs={
                                                     'placeholder': 'Search...',
-                                                    'class': 'search-input'
+                                                    'class': 'search-input',
+                                                    'list': 'search-suggestions',
+                                                    'autocomplete': 'off'
                                                     }))
 
 
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import environ
+from django.core.exceptions import ImproperlyConfigured
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +53,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'anymail',
     # custom apps
     'library',
@@ -148,8 +151,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'library.User'
 
 GOOGLE_BOOKS_API_KEY = env("GOOGLE_BOOKS_API_KEY")
+# volume search endpoint, point it at `manage.py fake_google_books` to work offline
+GOOGLE_BOOKS_API_URL = env("GOOGLE_BOOKS_API_URL", default="https://www.googleapis.com/books/v1/volumes")
+# seconds a volume search is served from the google_books cache
+GOOGLE_BOOKS_CACHE_TTL = env.int("GOOGLE_BOOKS_CACHE_TTL", default=60 * 60 * 24)
+# seconds to connect to, and to wait for an answer from, the api
+GOOGLE_BOOKS_CONNECT_TIMEOUT = 3.05
+GOOGLE_BOOKS_READ_TIMEOUT = 5
+# api requests per second each process may make, how many it may save up for
+# bursts, and seconds a search waits for its turn before giving up on the api
+GOOGLE_BOOKS_RATE_LIMIT = env.float("GOOGLE_BOOKS_RATE_LIMIT", default=5)
+GOOGLE_BOOKS_RATE_BURST = env.int("GOOGLE_BOOKS_RATE_BURST", default=10)
+GOOGLE_BOOKS_RATE_LIMIT_WAIT = 1
+# after this many failed api requests in a row searches only use the catalog
+# for GOOGLE_BOOKS_RESET_TIMEOUT seconds, then one request tries the api again
+GOOGLE_BOOKS_FAILURE_THRESHOLD = 5
+GOOGLE_BOOKS_RESET_TIMEOUT = 30
+# concurrent cover image downloads per search, and seconds before one gives up
+COVER_DOWNLOAD_WORKERS = 8
+COVER_DOWNLOAD_TIMEOUT = 10
+# failed cover downloads are retried after COVER_RETRY_DELAY seconds, doubling
+# every attempt, until COVER_MAX_ATTEMPTS
+COVER_RETRY_DELAY = 60
+COVER_MAX_ATTEMPTS = 5
+# books shown per list on the library and profile pages (and per "load
+# more"), and how many of the latest reviews and journals they show
+LIBRARY_LIST_LIMIT = 24
+LIBRARY_REVIEWS_LIMIT = 24
+LIBRARY_JOURNALS_LIMIT = 10
+# books per search results page, catalog matches first then google books
+SEARCH_PAGE_SIZE = 20
+# search-as-you-type: most suggestions returned, shortest prefix looked up,
+# and size/seconds of the per-process cache of short (popular) prefixes
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_CACHE_SIZE = 2000
+AUTOCOMPLETE_CACHE_TTL = 60
 MAILGUN_API_KEY = env("MAILGUN_API_KEY")
 
+# fitted recommender artifacts (vectorizer, memory-mapped tfidf matrix)
+RECOMMENDER_MODEL_DIR = BASE_DIR / 'recommender_model'
+# fraction of new books before the recommender model is refit
+RECOMMENDER_REBUILD_THRESHOLD = 0.05
+# "exact" scans every book, "lsh" uses a random projection index for large catalogs
+RECOMMENDER_SIMILARITY_BACKEND = 'exact'
+
+# per-process cache unless CACHE_URL points at a shared backend (redis, memcached)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # google books searches (library.google_books), locmem evicts least
+    # recently used entries past max_entries, use an allkeys-lru redis in production
+    'google_books': env.cache('GOOGLE_BOOKS_CACHE_URL', default='locmemcache://google-books?max_entries=5000'),
+}
+# locmem is per process: a signal only drops the entries of the process that
+# saved the change, every other web process keeps its copy until it expires
+LOCAL_CACHE = CACHES['default']['BACKEND'].endswith('LocMemCache')
+# seconds a rendered book card stays in the default cache, signals drop it
+# sooner when the book changes. short under locmem, other processes miss the signals
+BOOK_CARD_CACHE_TTL = 30 if LOCAL_CACHE else 60 * 60 * 24
+# seconds the shared part of a book's page and review page stays in the
+# default cache, signals drop it when reviews, journals or lists change. short
+# under locmem for the same reason
+BOOK_PAGE_CACHE_TTL = 30 if LOCAL_CACHE else 60 * 60
+
+# celery; set CELERY_BROKER_URL to a real broker and run a worker in production
+CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='memory://')
+# whether a worker runs queued tasks. without one nothing is queued and
+# library.tasks falls back to running the work right after the request commits
+BACKGROUND_TASKS = not CELERY_BROKER_URL.startswith('memory://')
+# the worker and every web process must see the same cache (recommendation
+# refresh flags, card and page invalidations)
+if BACKGROUND_TASKS and LOCAL_CACHE:
+    raise ImproperlyConfigured('CELERY_BROKER_URL needs a shared CACHE_URL (redis, memcached), not locmem')
+# eager tasks run in the calling process and ignore countdowns, tests only
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default='test' in sys.argv)
+CELERY_TASK_IGNORE_RESULT = True
+# download search result covers in the ingest_book_covers task instead of
+# during the search request, only worth it when a worker runs the task
+COVER_DOWNLOAD_IN_BACKGROUND = env.bool("COVER_DOWNLOAD_IN_BACKGROUND", default=BACKGROUND_TASKS)
+
+# seconds to wait after a review before refreshing that user's
+# recommendations, reviews posted in the meantime share one refresh
+RECOMMENDATION_REFRESH_DELAY = 30
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -22,10 +22,12 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path("", views.home, name="home"),
+    path("search/autocomplete", views.autocomplete, name="autocomplete"),
     path("register/", views.register, name="register"),
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
     path("library/", views.library, name="library"),
+    path("library/lists/<int:list_id>/", views.library_list, name="library_list"),
     path('admin/', admin.site.urls),
     path('about/', views.about, name="about"),
     path("books/<int:book_id>/", views.books, name="books"),
@@ -1,77 +1,27 @@
-import requests
-from urllib.parse import quote_plus
 from django.shortcuts import render, redirect, HttpResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.tokens import default_token_generator
 from .forms import RegisterForm, BookSearchForm, NewJournalForm, ListDropDownForm, NewReviewForm, LoginForm, PasswordResetForm, PasswordResetPasswordForm, UserProfileForm
 from django.conf import settings
-from datetime import datetime
-from library.models import Book, Genres, Authors, Covers, Journal, Tags, List, Reviews, UserRecommendations, User, UserFollow, BooksOwned
-from library.recommender import content_based_recommendations
-from django.core.files.base import ContentFile
-from django.core.exceptions import ValidationError
+from library.models import Book, Journal, Tags, List, Reviews, UserRecommendations, User, UserFollow
+from library.tasks import schedule_recommendation_refresh
+from library.search_results import results_page
+from library.autocomplete import suggest
+from library.user_library import load_library, more_books
+from library.book_cards import attach_cards
+from library.book_pages import book_page
 from django.core.mail import EmailMultiAlternatives
 from django.template import loader
 import logging
-from django.db.models import Q, Case, When, IntegerField, Value, Sum
 from django.urls import reverse
+from django.http import JsonResponse
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 
 logger = logging.getLogger('book_journal')
 
-API_KEY = settings.GOOGLE_BOOKS_API_KEY
-
 
 # helper methods
-def extract_isbn(volume_info):
-    # extract isbn
-    isbn_13 = None
-    for identifier in volume_info.get('industryIdentifiers', []):
-        if identifier['type'] == 'ISBN_13':
-            isbn_13 = identifier['identifier']
-            logger.debug(f'[ISBN]: Found isbn_13 {isbn_13}')
-            break
-    if not isbn_13:
-        isbn_10 = None
-        for identifier in volume_info.get('industryIdentifiers', []):
-            if identifier['type'] == 'ISBN_10':
-                isbn_10 = identifier['identifier']
-                logger.debug(f'[ISBN]: Found isbn_10 {isbn_10}')
-                break
-        isbn_13 = isbn_10  # use isbn-10 if isbn-13 isn't found
-    return isbn_13
-
-
-def extract_genre(volume_info):
-    try:
-        genres = [g for g in volume_info['categories']]
-        logger.info(f'[Extracting Genres]: Found genres {genres}')
-    except Exception as e:
-        logger.error(f'[Extracting Genres]: Error:\n{e}')
-        genres = ['None']
-    return genres
-
-
-def download_cover(url, book_title, isbn):
-    try:
-        img_response = requests.get(url, stream=True)
-        if img_response.status_code == 200:
-            logger.debug(f'[Image Download "{book_title}"]: Good URL response, attempting download.')
-            cover = Covers(image_url=url)
-            filename = f'{isbn}.png'
-            cover.image.save(filename, ContentFile(img_response.content), save=True)
-            cover_file = cover  # set cover_image
-            logger.info(f'[Image Download "{book_title}"]: Successfully saved to DB.')
-            return cover_file
-    except ValidationError as e:
-        logger.error(f'[Image Download: "{book_title}"] Validation error: \n{e}')
-    except Exception as e:
-        logger.error(f'[Image Download: "{book_title}"] Image failed to download.')
-        logger.debug(f'Image link: {url}')
-        logger.error(f'Error:\n{e}')
-
-
 def send_confirmation_email(user, verify_link):
     subject = "Confirm your account"
     from_email = "noreply@oddish1.com"
@@ -155,11 +105,20 @@ def send_follow_email(user, follower, link):
     msg.attach_alternative(html_content, "text/html")
     msg.send()
 
+def currently_reading_books(user):
+    # the user's currently reading list, covers joined for the carousels
+    return Book.objects.filter(list__user=user, list__name="Currently Reading").select_related('thumbnail_cover')
+
+
+# related rows every page showing a single book needs
+BOOK_DETAILS = ['authors', 'genres']
+
+
 # Create your views here.
 def home(request):
     form = BookSearchForm()
     stored_results = []
-    results = []
+    next_cursor = None
     user_results = {}
     query = ""
     if request.method == "GET" and "query" in request.GET:
@@ -177,265 +136,26 @@ def home(request):
                                     )
                         user_data.update({user: link})
                     user_results = user_data
-                # local db search and basic ranking
+                # catalog matches first, then google books pages, one page per request
                 else:
-                    results = Book.objects.filter(
-                            Q(title__icontains=query) |
-                            Q(authors__name__icontains=query) |
-                            Q(isbn__iexact=query) |
-                            Q(description__icontains=query)
-                    ).annotate(
-                        relevance=Sum(Case(
-                            When(title__icontains=query, then=Value(3)),
-                            When(authors__name__icontains=query, then=Value(2)),
-                            When(isbn__iexact=query, then=Value(5)),
-                            When(description__icontains=query, then=Value(1)),
-                            default=Value(0),
-                            output_field=IntegerField()))).distinct().order_by("-relevance")
-                    # search API and create new Books to save to local db
-                    encoded_query = quote_plus(query)
-                    url = f'https://www.googleapis.com/books/v1/volumes?q={encoded_query}&maxResults=40&orderBy=relevance&printType=books&key={API_KEY}'
-                    response = requests.get(url)
-                    if response.status_code == 200:
-                        data = response.json()
-                        api_results = data.get("items", [])
-                        # caches to prevent repeated db hits
-                        genre_cache = {}
-                        author_cache = {}
-                        cover_cache = {}
-                        new_books = []
-                        book_author_links = []  # (book, authors) tuples for many to many relationsip
-                        book_genre_links = []  # (book, genres) tuples for many to many relationship
-                        stored_results = []
-
-                        for result in api_results:
-                            volume_info = result['volumeInfo']
-                            isbn = extract_isbn(volume_info)
-
-                            try:
-                                book_title = volume_info['title']
-                            except Exception:
-                                book_title = "Unknown Title"
-
-                            # genres
-                            genres = []
-                            genre_names = extract_genre(volume_info)
-                            for genre_name in genre_names:
-                                genre = genre_cache.get(genre_name)
-                                if not genre:
-                                    try:
-                                        genre = Genres.objects.get(genre=genre_name)
-                                    except Genres.DoesNotExist:
-                                        genre = Genres(genre=genre_name)
-                                        genre_cache[genre_name] = genre  # hold for later bulk_create
-                                genres.append(genre)
-
-                            # authors
-                            try:
-                                authors_names = volume_info.get("authors") or ["Unkown Author"]
-                                logger.debug(f'[Author Import]: found {authors_names}')
-                                logger.debug(f'[Book Import "{book_title}"]: found authors ({authors_names})')
-                                authors = []
-                                for name in authors_names:
-                                    author = author_cache.get(name)
-                                    if not author:
-                                        try:
-                                            author = Authors.objects.get(name=name)
-                                            logger.debug(f'[Author Import]: Author "{author}" exists in db')
-                                        except Authors.DoesNotExist:
-                                            logger.debug(f'[Author Import]: Author DNE, attempting to create.')
-                                            author = Authors(name=name)
-                                            author_cache[name] = author  # hold for later bulk_create
-                                    authors.append(author)
-                                    logger.info(f'[Book Import "{book_title}"]: added authors {authors}')
-                            except Exception as e:
-                                logger.error(f'[Book Import: "{book_title}"] authors could not be added.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-
-                            # set cover image
-                            # ideally using PostgreSQL, would async image downloads, with sqlite this causes db locking errors.
-                            # this is a current bottleneck, but don't have time to move to a different db right now.
-                            try:
-                                cover_image_url = volume_info['imageLinks']['thumbnail']
-                                logger.debug(f'[Image Download "{book_title}"]: image URL ({cover_image_url})')
-                                cover = cover_cache.get(cover_image_url) or Covers.objects.filter(image_url=cover_image_url).first()
-                                if not cover:
-                                    cover = download_cover(cover_image_url, book_title, isbn)
-                            except Exception as e:
-                                logger.warning(f'[Book Import: "{book_title}"] thumbnail_cover could not be added. Setting to None.')
-                                cover = None
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.error(f'Error:\n{e}')
-
-                            # add title
-                            try:
-                                title = book_title
-                                logger.debug(f'[Book Import "{book_title}"]: Added title {title}')
-                            except Exception as e:
-                                logger.warning(f'[Book Import: "{book_title}"] title could not be added. Setting to None.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-
-                            # add page_count
-                            try:
-                                page_count = volume_info.get("pageCount")
-                                logger.debug(f'[Book Import "{book_title}"]: Added page count {page_count}')
-                            except Exception as e:
-                                logger.warning(f'[Book Import: "{book_title}"] page_count could not be added. Setting to None.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-
-                            # add publisher
-                            try:
-                                publisher = volume_info.get("publisher")
-                                if isinstance(publisher, list):
-                                    try:
-                                        publishers = [pub for pub in publisher]
-                                        publisher = ", ".join(publishers)
-                                    except Exception as e:
-                                        logger.error(f'[Adding Publishers: "{book_title}"] unable to join publishers into single string.')
-                                        logger.debug(f'Error: {e}')
-                                logger.debug(f'[Book Import "{book_title}"]: Added publisher "{publisher}"')
-                            except Exception as e:
-                                logger.warning(f'[Book Import: "{book_title}" publisher could not be added. Setting to None.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-                                publisher = None
-
-                            # add publisher date
-                            try:
-                                publisher_date = volume_info.get("publishedDate")
-                                try:
-                                    date = datetime.strptime(publisher_date, "%Y-%m-%d")
-                                    date = datetime.strftime(date, "%Y-%m-%d")
-                                except Exception as e:
-                                    logger.warning(f'[Date Conversion "{book_title}"]: date not in "Y-m-d" format. Trying different format.')
-                                    logger.debug(f'Error:\n{e}')
-                                    try:
-                                        date = datetime.strptime(publisher_date, "%Y")
-                                        date = datetime.strftime(date, "%Y-%m-%d")
-                                        logger.info(f'[Date Conversion "{book_title}"]: date stored in "Y" format: {date}')
-                                    except Exception as e:
-                                        logger.warning(f'[Date Conversion "{book_title}"]: date not in "Y" format. Trying different format.')
-                                        logger.debug(f'Error:\n{e}')
-                                        try:
-                                            date = datetime.strptime(publisher_date, "%Y-%m")
-                                            date = datetime.strftime(date, "%Y-%m-%d")
-                                        except Exception:
-                                            logger.warning(f'[Date Conversion "{book_title}"]: date not in "Y-M format. Attempting to set date from string value if possible.')
-                                            try:
-                                                date = datetime.strptime("1111-01-01", "%Y-%m-%d")
-                                                date = datetime.strftime(date, "%Y-%m-%d")
-                                                logger.warning(f'[Date Conversion "{book_title}"] couldn\'t parse date, setting to {date}')
-                                            except Exception as e:
-                                                logger.warning(f'[Date Conversion "{book_title}"] date not a string. Setting publisher_date to None.')
-                                                logger.debug(f'Error:\n{e}')
-                                                date = None
-                            except Exception as e:
-                                logger.error(f'[Book Import "{book_title}"] unable to set date.')
-                                logger.debug(f'Error:\n{e}')
-
-                            # add description
-                            try:
-                                description = volume_info.get("description")
-                                logger.info(f'[Book Import "{book_title}"]: Added description')
-                            except Exception as e:
-                                logger.warning(f'[Book Import "{book_title}"] unable to set description. Setting to None.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-                                description = None
-
-                            # add print type
-                            try:
-                                print_type = volume_info.get("printType").lower()
-                                logger.info(f'[Book Import "{book_title}"]: Added print type "{print_type}"')
-                            except Exception as e:
-                                logger.warning(f'[Book Import "{book_title}"] unable to set print_type. Setting to None.')
-                                print_type = None
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.debug(f'Error:\n{e}')
-
-                            # add language
-                            try:
-                                logger.debug("Trying to set language")
-                                language = volume_info.get('language')
-                                if isinstance(language, str):
-                                    logger.debug("language is str")
-                                if isinstance(language, list):
-                                    logger.debug('language is list')
-                                    languages = [lang for lang in language]
-                                    language = " ,".join(languages)
-                                else:
-                                    logger.warning(f'[Book Import "{book_title}"] unable to set language. Setting to None.')
-                                    logger.debug(f'volumeInfo:\n{volume_info}')
-                                    language = None
-                                logger.info(f'[Book Import "{book_title}"]: Added language "{language}"')
-                            except Exception as e:
-                                logger.error(f'[Book Import "{book_title}"] error while setting language.')
-                                logger.debug(f'Error:\n{e}')
-
-                            try:
-                                new_book = Book(
-                                    thumbnail_cover=cover,
-                                    title=title,
-                                    page_count=page_count,
-                                    publisher=publisher,
-                                    published_date=date,
-                                    description=description,
-                                    print_type=print_type,
-                                    language=language,
-                                    isbn=isbn)
-                                new_books.append(new_book)
-                                book_author_links.append((new_book, authors))
-                                book_genre_links.append((new_book, genres))
-                            except ValidationError as e:
-                                logger.error(f'Validation error for "{book_title}":\n{e}')
-                            except Exception as e:
-                                logger.error('Book import failed.')
-                                logger.debug(f'volumeInfo:\n{volume_info}')
-                                logger.error(f'Error:\n{e}')
-                        # bulk save related models first
-                        Genres.objects.bulk_create(genre_cache.values(), ignore_conflicts=True)
-                        Authors.objects.bulk_create(author_cache.values(), ignore_conflicts=True)
-                        # save books
-                        Book.objects.bulk_create(new_books, ignore_conflicts=True)
-                        # attatch many to many relationships
-                        all_authors = set(a.name for _, authors in book_author_links for a in authors)
-                        saved_authors = {a.name: a for a in Authors.objects.filter(name__in=all_authors)}
-                        book_author_links = [(book, [saved_authors[a.name] for a in authors]) for book, authors in book_author_links]
-                        for book, authors in book_author_links:
-                            saved_book = Book.objects.filter(isbn=book.isbn).first()
-                            if saved_book:
-                                saved_book.authors.set(authors)
-                                saved_book.save()
-                            else:
-                                logger.warning(f'[Book Import]: Could not find saved_book for ISBN: {book.isbn}')
-                        all_genres = set(g.genre for _, genres in book_genre_links for g in genres)
-                        saved_genres = {g.genre: g for g in Genres.objects.filter(genre__in=all_genres)}
-                        book_genre_links = [(book, [saved_genres[g.genre] for g in genres]) for book, genres in book_genre_links]
-                        for book, genres in book_genre_links:
-                            saved_book = Book.objects.filter(isbn=book.isbn).first()
-                            if saved_book:
-                                saved_book.genres.set(genres)
-                                saved_book.save()
-                                stored_results.append(saved_book)
-                            else:
-                                logger.warning(f'[Book Import]: Could not find saved_book for ISBN: {book.isbn}')
-
-            else:
-                # add extra search stuff here
-                stored_results = results
+                    stored_results, next_cursor = results_page(query, request.GET.get("cursor"))
+
     # Render the HTML template index.html
     if request.user.is_authenticated:
-        currently_reading = Book.objects.filter(list=List.objects.get(user=request.user, name="Currently Reading"))
-        recommendations = UserRecommendations.objects.filter(user=request.user)
+        # the currently reading carousel is replaced by search results
+        currently_reading = [] if stored_results or user_results else list(currently_reading_books(request.user))
+        recommendations = list(UserRecommendations.objects.filter(user=request.user).select_related(
+            'book__thumbnail_cover'))
+        # every card of the page in one cache round trip
+        attach_cards(currently_reading + [recommendation.book for recommendation in recommendations]
+                     + stored_results)
         context = {"form": form,
                    "stored_results": stored_results,
                    "user_results": user_results,
                    "page_title": "home",
                    "currently_reading": currently_reading,
                    "query": query,
+                   "next_cursor": next_cursor,
                    "recommendations": recommendations}
         return render(request, 'index.html', context)
         logger.debug(f'currently_reading({type(currently_reading)}): {currently_reading}')
@@ -444,10 +164,21 @@ def home(request):
                "user_results": user_results,
                "stored_results": stored_results,
                "query": query,
+               "next_cursor": next_cursor,
                "page_title": "home"}
     return render(request, 'index.html', context)
 
 
+def autocomplete(request):
+    # json suggestions for the search box, never calls the google books api
+    query = request.GET.get("q", "")
+    try:
+        limit = int(request.GET.get("limit", settings.AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.AUTOCOMPLETE_LIMIT
+    return JsonResponse({"query": query, "suggestions": suggest(query, max(limit, 1))})
+
+
 def register(request):
     if request.method == "POST":
         form = RegisterForm(request.POST)
@@ -596,32 +327,14 @@ def password_reset_complete(request):
 
 
 def books(request, book_id):
-    book = Book.objects.get(id=book_id)
-    num_journals = Journal.objects.filter(book=book, is_public=True).count()
-    num_reading = Book.objects.filter(id=book_id, list__name="Currently Reading").values("list__user").distinct().count()
-    num_finished = Book.objects.filter(id=book_id, list__name="Finished").count()
-    num_reviews = book.ratings_count
-    if book.average_rating:
-        average_rating = round(book.average_rating, 2)
-    else:
-        average_rating = None
-    stars = []
-    for i in range(1, 6):
-        if average_rating is None:
-            stars.append("empty")
-        elif average_rating >= i:
-            stars.append("full")
-        elif average_rating >= i - 0.5:
-            stars.append("half")
-        else:
-            stars.append("empty")
-    logger.debug(f'book: {book}\nrating: {average_rating} ({num_reviews})')
-    currently_reading = Book.objects.filter(list=List.objects.get(user=request.user, name="Currently Reading"))
-    logger.debug(f'currently_reading: {currently_reading}')
+    # the book itself is cached, only the user's lists are loaded per request
+    page = book_page('details', book_id)
+    book_lists = list(List.objects.filter(user=request.user, list=book_id))
     template = loader.get_template("books.html")
     if request.method == "POST":
         form = ListDropDownForm(request.POST, user=request.user)
         if form.is_valid():
+            book = Book.objects.get(id=book_id)
             selected_lists = form.cleaned_data['lists']
             logger.debug(f'selected_lists: {selected_lists}')
             for lst in selected_lists:
@@ -634,18 +347,13 @@ def books(request, book_id):
             return redirect('books', book_id=book.id)
     else:
         form = ListDropDownForm(user=request.user, initial={
-                                'lists': book.list.all()
+                                'lists': book_lists
                                 })
-    context = {"book": book,
-               "currently_reading": currently_reading,
-               "page_title": book.title.lower(),
-               "form": form,
-               "num_journals": num_journals,
-               "num_reading": num_reading,
-               "num_finished": num_finished,
-               "num_reviews": num_reviews,
-               "average_rating": average_rating,
-               "stars": stars}
+    context = {"book_id": book_id,
+               "page": page,
+               "currently_reading": any(lst.name == "Currently Reading" for lst in book_lists),
+               "page_title": page['title'].lower(),
+               "form": form}
     return HttpResponse(template.render(context, request))
 
 
@@ -655,7 +363,9 @@ def journal(request):
         return redirect("home")
     else:
         # if finished books with no review, prompt user to review books
-        journals = Journal.objects.filter(user=request.user).order_by("-created_at")
+        journals = list(Journal.objects.filter(user=request.user).order_by("-created_at")
+                        .select_related('book__thumbnail_cover').prefetch_related('tags'))
+        attach_cards([journal.book for journal in journals])
         template = loader.get_template("journal/index.html")
         context = {"journals": journals,
                    "page_title": "journal"}
@@ -734,56 +444,43 @@ def library(request):
     if not request.user.is_authenticated:
         return redirect("home")
     else:
-        # lists a dictionary of { "name": [BookObjects] }
-        lists = {}
-        user_lists = List.objects.filter(user=request.user)
-        for lst in user_lists:
-            books = Book.objects.filter(list=lst)
-            lists[lst.name] = books
-        logger.debug(f'lists with books: {lists}')
-        # currently_reading a list of Book objects
-        currently_reading = lists['Currently Reading']
-        logger.debug(f'currently_reading: {currently_reading}')
-        # latest_journals a list of 5 most recent Journal Objects
-        latest_journals = Journal.objects.filter(user=request.user).order_by("-created_at")[:10]
-        logger.debug(f'latest_journals: {latest_journals}')
-        user = request.user
-        # all of a user's reviewed books
-        user_reviews = Reviews.objects.filter(user=request.user)
-        logger.debug(f'reviews: {user_reviews}')
-        # books the user hasn't reviewed yet
-        reviewed_book_ids = user_reviews.values_list('book_id', flat=True)
-        need_reviews = lists['Finished'].exclude(id__in=reviewed_book_ids)
-        reviews = []
-        for review in user_reviews:
-            item = []
-            item.append(review)
-            stars = []
-            rating = review.rating
-            for i in range(1, 6):
-                if rating >= i:
-                    stars.append("full")
-                elif rating >= i - 0.5:
-                    stars.append("half")
-                else:
-                    stars.append("empty")
-            item.append(stars)
-            reviews.append(item)
-        reviews.reverse()
-        logger.debug(f'reviews: {reviews}')
-        logger.debug(f'need_reviews: {need_reviews}')
+        # lists (first books of each), reviews, journals and review prompts
+        # in a fixed number of queries
+        library_data = load_library(request.user)
+        logger.debug(f'lists: {[(lst.name, lst.book_count) for lst in library_data["lists"]]}')
         template = loader.get_template("library.html")
         context = {"page_title": "library",
-                   "currently_reading": currently_reading,
-                   "lists": lists,
-                   "reviews": reviews,
-                   "need_reviews": need_reviews,
-                   "latest_journals": latest_journals,
-                   "user": user,
+                   "lists": library_data["lists"],
+                   "reviews": library_data["reviews"],
+                   "need_reviews": library_data["need_reviews"],
+                   "latest_journals": library_data["journals"],
+                   "user": request.user,
                    }
         return HttpResponse(template.render(context, request))
 
 
+def library_list(request, list_id):
+    # every book of one list, LIBRARY_LIST_LIMIT at a time
+    lst = List.objects.select_related('user').filter(id=list_id).first()
+    if lst is None:
+        return redirect("home")
+    if lst.user != request.user and not lst.user.is_public:
+        return redirect(reverse('profile_not_public', kwargs={'username': lst.user.username}))
+    try:
+        start = max(int(request.GET.get("start", 0)), 0)
+    except ValueError:
+        start = 0
+    books, next_start = more_books(lst, start)
+    attach_cards(books)
+    template = loader.get_template("library_list.html")
+    context = {"page_title": lst.name.lower(),
+               "list": lst,
+               "books": books,
+               "next_start": next_start,
+               }
+    return HttpResponse(template.render(context, request))
+
+
 def new_review(request, book_id=None):
     if not request.user.is_authenticated:
         return redirect("home")
@@ -815,21 +512,9 @@ def new_review(request, book_id=None):
                 book.ratings_count = ratings_count
                 book.save()
                 logger.debug(f'Book Rating: {average_rating} ({ratings_count})')
-                recs, scores = content_based_recommendations(request.user)
-                # clear out old recommendations
-                UserRecommendations.objects.filter(user=request.user).delete()
-                recs = recs.reset_index()
-                logger.debug(f'RECS: {None if recs.empty else recs}')
-                logger.debug(f'SCORES: {None if scores.size == 0 else scores}')
-                for idx, title in recs['title'].items():
-                    score = scores[idx]
-                    book = Book.objects.filter(title__iexact=title).first()
-                    UserRecommendations.objects.create(
-                        user=request.user,
-                        book=book,
-                        score=score
-                    )
-                logger.info("Recommendations updated!")
+                # recompute recommendations in the background, reviews posted
+                # in quick succession share a single refresh
+                schedule_recommendation_refresh(request.user)
                 return redirect("home")
         else:
             initial_data = {'book': book} if book else None
@@ -853,43 +538,11 @@ def generate_recommendations(request):
 def book_reviews_aggregate(request, book_id):
     if not request.user.is_authenticated:
         return redirect("home")
-    book = Book.objects.get(id=book_id)
-    book_reviews = Reviews.objects.filter(book=book, is_approved=True)
-    if book.average_rating:
-        average_rating = round(book.average_rating, 2)
-        num_reviews = book.ratings_count
-        average_stars = []
-        for i in range(1, 6):
-            if average_rating >= i:
-                average_stars.append("full")
-            elif average_rating >= i - 0.5:
-                average_stars.append("half")
-            else:
-                average_stars.append("empty")
-    else:
-        average_rating = None
-        num_reviews = 0
-    stars = []
-    for review in book_reviews:
-        rating = review.rating
-        rating_stars = []
-        for i in range(1, 6):
-            if rating >= i:
-                rating_stars.append("full")
-            elif rating >= i - 0.5:
-                rating_stars.append("half")
-            else:
-                rating_stars.append("empty")
-        stars.append(rating_stars)
-    review_data = zip(book_reviews, stars)
     template = loader.get_template('review_aggregation.html')
     context = {
             "page_title": "reviews",
-            "review_data": review_data,
-            "book": book,
-            "average_rating": average_rating,
-            "num_reviews": num_reviews,
-            "average_stars": average_stars,
+            "book_id": book_id,
+            "page": book_page('reviews', book_id),
     }
     return HttpResponse(template.render(context, request))
 
@@ -897,41 +550,17 @@ def book_reviews_aggregate(request, book_id):
 def book_review(request, review_id):
     if not request.user.is_authenticated:
         return redirect("home")
-    review = Reviews.objects.get(id=review_id)
+    review = Reviews.objects.select_related('book__thumbnail_cover', 'user').prefetch_related(
+        *[f'book__{related}' for related in BOOK_DETAILS]).get(id=review_id)
     book = review.book
     num_reviews = book.ratings_count
     average_rating = book.average_rating
-    if average_rating:
-        average_stars = []
-        for i in range(1, 6):
-            if average_rating >= i:
-                average_stars.append("full")
-            elif average_rating >= i - 0.5:
-                average_stars.append("half")
-            else:
-                average_stars.append("empty")
-    if review:
-        rating = review.rating
-    else:
-        rating = None
-        stars = []
-    if rating:
-        stars = []
-        for i in range(1, 6):
-            if rating >= i:
-                stars.append("full")
-            elif rating >= i - 0.5:
-                stars.append("half")
-            else:
-                stars.append("empty")
     template = loader.get_template('book_review.html')
     context = {
             "page_title": "review",
             "review": review,
-            "rating": rating,
-            "stars": stars,
+            "rating": review.rating,
             "average_rating": average_rating,
-            "average_stars": average_stars,
             "book": book,
             "num_reviews": num_reviews,
     }
@@ -941,7 +570,8 @@ def book_review(request, review_id):
 def book_journal(request, journal_id):
     if not request.user.is_authenticated:
         return redirect("home")
-    journal = Journal.objects.get(id=journal_id)
+    journal = Journal.objects.select_related('book__thumbnail_cover', 'user').prefetch_related(
+        'tags', *[f'book__{related}' for related in BOOK_DETAILS]).get(id=journal_id)
     book = journal.book
     template = loader.get_template('book_journal.html')
     context = {
@@ -993,38 +623,17 @@ def public_profile(request, username):
         return redirect(reverse('profile_dne', kwargs={'username': username}))
     if not user.is_public and user != request.user:
         return redirect(reverse('profile_not_public', kwargs={'username': username}))
-    user_lists = List.objects.filter(user=user)
-    lists = []
-    for lst in user_lists:
-        books = Book.objects.filter(list=lst)
-        lists.append((lst.name, books))
-    user_journals = Journal.objects.filter(user=user, is_public=True)
+    library_data = load_library(user, profile=True)
     user_followers = UserFollow.objects.filter(followed=user)
     user_following = UserFollow.objects.filter(follower=user)
-    user_reviews = Reviews.objects.filter(user=user, is_approved=True)
-    reviews = []
-    for review in user_reviews:
-        stars = []
-        rating = review.rating
-        if rating:
-            stars = []
-            for i in range(1, 6):
-                if rating >= i:
-                    stars.append("full")
-                elif rating >= i - 0.5:
-                    stars.append("half")
-                else:
-                    stars.append("empty")
-        reviews.append((review, stars))
-    owned_books = BooksOwned.objects.filter(user=user)
     user_data = {
         'user': user,
-        'lists': lists,
-        'journals': user_journals,
+        'lists': library_data['lists'],
+        'journals': library_data['journals'],
         'followers': user_followers,
         'following': user_following,
-        'reviews': reviews,
-        'owned_books': owned_books
+        'reviews': library_data['reviews'],
+        'owned_books': library_data['owned_books'],
     }
     template = loader.get_template('public_profile.html')
     if request.user == user:
@@ -1083,9 +692,10 @@ def user_follow(request, username):
 def book_journals_aggregate(request, book_id):
     if not request.user.is_authenticated:
         return redirect('home')
-    book = Book.objects.get(id=book_id)
-    journals = Journal.objects.filter(book=book, is_public=True).order_by("-created_at")
-    currently_reading = Book.objects.filter(list=List.objects.get(user=request.user, name="Currently Reading"))
+    book = Book.objects.select_related('thumbnail_cover').get(id=book_id)
+    journals = (Journal.objects.filter(book=book, is_public=True).order_by("-created_at")
+                .select_related('user').prefetch_related('tags'))
+    currently_reading = currently_reading_books(request.user)
     context = {
             "page_title": "journals | " + book.title,
             "book": book,
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, List, Covers, Genres, Authors, Book, Journal, UserFollow, UserRecommendations, Tags, Reviews, BooksOwned
+from .models import User, List, Covers, Genres, Authors, Book, Journal, UserFollow, UserRecommendations, Tags, Reviews, BooksOwned, Works, BookStats
 
 # Register your models here.
 
@@ -16,4 +16,5 @@ admin.site.register(UserRecommendations)
 admin.site.register(Tags)
 admin.site.register(Reviews)
 admin.site.register(BooksOwned)
-
+admin.site.register(Works)
+admin.site.register(BookStats)
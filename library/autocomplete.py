@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models.functions import Upper
+from django.urls import reverse
+from django.utils.http import urlencode
+from library.models import Authors, Book, User
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# prefixes this short match the most rows and are typed by everyone, they are
+# served from the hot prefix cache. longer ones are selective enough for the indexes
+HOT_PREFIX_LENGTH = 4
+# suggestions are fetched from the database with a few spares so dropping
+# repeated titles (editions of the same work) still fills the list
+OVERFETCH = 3
+
+# per-process lru of {(prefix, limit): (expires, suggestions)}, no network
+# round trip even when the default cache is remote
+_hot = OrderedDict()
+_hot_lock = threading.Lock()
+
+
+def normalize_prefix(query):
+    return ' '.join(query.lower().split())[:100]
+
+
+def cached(key):
+    with _hot_lock:
+        entry = _hot.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _hot[key]
+            return None
+        _hot.move_to_end(key)
+        return entry[1]
+
+
+def remember(key, suggestions):
+    with _hot_lock:
+        _hot[key] = (time.monotonic() + settings.AUTOCOMPLETE_CACHE_TTL, suggestions)
+        _hot.move_to_end(key)
+        while len(_hot) > settings.AUTOCOMPLETE_CACHE_SIZE:
+            _hot.popitem(last=False)
+
+
+def clear_cache():
+    with _hot_lock:
+        _hot.clear()
+
+
+def title_suggestions(prefix, limit):
+    # titles starting with prefix (upper(title) pattern index), most rated first,
+    # topped up with titles containing it (upper(title) trigram index on postgres)
+    rows = list(Book.objects.filter(title__istartswith=prefix)
+                .order_by('-ratings_count', Upper('title'), 'id')
+                .values_list('id', 'title')[:limit * OVERFETCH])
+    if len(rows) < limit * OVERFETCH and len(prefix) >= 3:
+        rows += (Book.objects.filter(title__icontains=prefix).exclude(title__istartswith=prefix)
+                 .order_by('-ratings_count', 'id').values_list('id', 'title')[:limit * OVERFETCH - len(rows)])
+    seen = set()
+    suggestions = []
+    for book_id, title in rows:
+        if title.lower() in seen:
+            continue
+        seen.add(title.lower())
+        suggestions.append({'type': 'book', 'label': title, 'url': reverse('books', args=[book_id])})
+    return suggestions[:limit]
+
+
+def author_suggestions(prefix, limit):
+    names = (Authors.objects.filter(name__istartswith=prefix).order_by(Upper('name'))
+             .values_list('name', flat=True)[:limit])
+    return [{'type': 'author', 'label': name, 'url': f"{reverse('home')}?{urlencode({'query': name})}"} for name in names]
+
+
+def user_suggestions(prefix, limit):
+    usernames = (User.objects.filter(is_public=True, username__istartswith=prefix).order_by(Upper('username'))
+                 .values_list('username', flat=True)[:limit])
+    return [{'type': 'user', 'label': f'@{username}', 'url': reverse('public_profile', args=[username])}
+            for username in usernames]
+
+
+def lookup(prefix, limit):
+    if prefix.startswith('@'):
+        return user_suggestions(prefix[1:], limit) if prefix[1:] else []
+    titles = title_suggestions(prefix, limit)
+    # authors fill whatever the titles left, at least a couple of them
+    authors = author_suggestions(prefix, max(limit - len(titles), min(2, limit)))
+    return (titles[:limit - len(authors)] + authors)[:limit]
+
+
+def suggest(query, limit=None):
+    """
+    search-as-you-type suggestions for query: book titles and author names,
+    public usernames when query starts with @ (like the search page).
+
+    parameters:
+    - query: what is typed in the search box so far
+    - limit: maximum number of suggestions, AUTOCOMPLETE_LIMIT by default
+
+    returns:
+    - list of {'type': 'book'|'author'|'user', 'label', 'url'} dicts, best first
+    """
+    limit = min(limit or settings.AUTOCOMPLETE_LIMIT, settings.AUTOCOMPLETE_LIMIT)
+    prefix = normalize_prefix(query)
+    if len(prefix.lstrip('@')) < settings.AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    hot = len(prefix) <= HOT_PREFIX_LENGTH
+    if hot:
+        suggestions = cached((prefix, limit))
+        if suggestions is not None:
+            return suggestions
+    suggestions = lookup(prefix, limit)
+    if hot:
+        remember((prefix, limit), suggestions)
+    return suggestions
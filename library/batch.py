@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections, transaction
+from library.dataset import load_ratings
+from library.model_store import read_model
+from library.models import Book, UserRecommendations
+from library.recommender import get_model
+from scipy import sparse
+import numpy as np
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# cap on the dense (users x books) score block a worker holds at once
+MAX_SCORE_CELLS = 50_000_000
+
+# model loaded once per pool worker by init_worker
+_worker_model = None
+
+
+def profile_weights(model, ratings):
+    """
+    users x books matrix of rating weights, each row sums to 1.
+
+    a user's profile is then weights @ tfidf_matrix, the same rating
+    weighted average content_based_recommendations computes for one user.
+    books the model hasn't seen yet are skipped.
+
+    returns:
+    - (weights csr matrix, sorted user ids for its rows)
+    """
+    ratings = ratings.groupby(['user_id', 'book_id'], as_index=False)['rating'].mean()
+    rows = model.rows_for(ratings['book_id'].values)
+    ratings = ratings[rows >= 0]
+    rows = rows[rows >= 0]
+    user_ids, user_rows = np.unique(ratings['user_id'].values, return_inverse=True)
+    values = ratings['rating'].fillna(0).values.astype(np.float32)
+    weights = sparse.csr_matrix((values, (user_rows, rows)), shape=(len(user_ids), model.matrix.shape[0]))
+    weights.sum_duplicates()
+    sums = np.asarray(weights.sum(axis=1)).ravel()
+    # users whose ratings are all zero weight their books equally
+    zero = np.repeat(sums == 0, np.diff(weights.indptr))
+    weights.data[zero] = 1
+    sums = np.asarray(weights.sum(axis=1)).ravel()
+    weights = sparse.diags(1 / np.maximum(sums, 1e-12)).dot(weights).tocsr()
+    return weights, user_ids.astype(np.int64)
+
+
+def score_block(matrix, weights, top_n):
+    """
+    top_n book rows for every user row of weights, rated books excluded.
+
+    returns:
+    - (rows, scores) arrays of shape (users, top_n), best first. slots a user
+      can't fill (tiny catalogs) have a score of -inf.
+    """
+    profiles = weights.dot(matrix)
+    scores = profiles.dot(matrix.T).toarray()
+    rated_users, rated_books = weights.nonzero()
+    scores[rated_users, rated_books] = -np.inf
+    k = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def init_worker(model_path):
+    global _worker_model
+    _worker_model = read_model(model_path)
+
+
+def score_shard(weights, top_n):
+    return score_block(_worker_model.matrix, weights, top_n)
+
+
+def user_chunks(n_users, n_books, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = max(1, MAX_SCORE_CELLS // max(n_books, 1))
+    return [(start, min(start + chunk_size, n_users)) for start in range(0, n_users, chunk_size)]
+
+
+def write_recommendations(model, user_ids, weights, rows, scores, works):
+    """
+    replace the stored recommendations of every user in user_ids, dropping
+    other editions of works the user rated or was already recommended.
+    """
+    recommendations = []
+    for i, user_id in enumerate(user_ids):
+        seen = {works[book_id] for book_id in model.book_ids[weights[i].indices] if works.get(book_id)}
+        for row, score in zip(rows[i], scores[i]):
+            if not np.isfinite(score):
+                continue
+            book_id = int(model.book_ids[row])
+            if book_id not in works:
+                continue  # deleted since the model was built
+            work_id = works[book_id]
+            if work_id is not None:
+                if work_id in seen:
+                    continue
+                seen.add(work_id)
+            recommendations.append(UserRecommendations(user_id=int(user_id), book_id=book_id, score=float(score)))
+    with transaction.atomic():
+        UserRecommendations.objects.filter(user_id__in=[int(u) for u in user_ids]).delete()
+        UserRecommendations.objects.bulk_create(recommendations, batch_size=1000)
+    return len(recommendations)
+
+
+def refresh_all(top_n=20, workers=1, chunk_size=None, on_chunk=None):
+    """
+    recompute and store recommendations for every user with a review.
+
+    parameters:
+    - top_n: candidates scored per user before edition deduplication
+    - workers: scoring processes, 1 scores in this process
+    - chunk_size: users scored per block, sized from the catalog when None
+    - on_chunk: optional callback(users_done, users_total) for progress
+
+    returns:
+    - (users refreshed, recommendations written), users refreshed includes
+      the users whose recommendations were cleared
+    """
+    model = get_model()
+    if model is None:
+        return 0, 0
+    ratings = load_ratings()
+    weights, user_ids = profile_weights(model, ratings)
+    # every book these users rated is newer than the model, there's no
+    # profile to score: clear their old recommendations instead of leaving them stale
+    unscored = np.setdiff1d(ratings['user_id'].unique().astype(np.int64), user_ids)
+    if len(unscored):
+        UserRecommendations.objects.filter(user_id__in=[int(u) for u in unscored]).delete()
+        logger.info(f'[Batch Recommendations]: cleared {len(unscored)} users with only books newer than the model')
+    works = dict(Book.objects.values_list('id', 'work_id').iterator(chunk_size=20000))
+    chunks = user_chunks(len(user_ids), model.matrix.shape[0], chunk_size)
+    shards = [weights[start:stop] for start, stop in chunks]
+    logger.info(f'[Batch Recommendations]: {len(user_ids)} users in {len(chunks)} chunks, {workers} workers')
+    if workers == 1:
+        results = (score_block(model.matrix, shard, top_n) for shard in shards)
+        pool = None
+    else:
+        # forked workers must not share this process' database connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model.path,))
+        results = pool.map(score_shard, shards, [top_n] * len(shards))
+    written = 0
+    try:
+        for (start, stop), shard, (rows, scores) in zip(chunks, shards, results):
+            written += write_recommendations(model, user_ids[start:stop], shard, rows, scores, works)
+            if on_chunk:
+                on_chunk(stop, len(user_ids))
+    finally:
+        if pool:
+            pool.shutdown()
+    return len(user_ids) + len(unscored), written
@@ -0,0 +1,80 @@
+import gc
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def environment(**extra):
+    # what a result file needs to be compared with another one
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'database': connection.vendor,
+        'cpus': os.cpu_count(),
+        **extra,
+    }
+
+
+@contextmanager
+def test_database():
+    # run against a throwaway copy of the schema, never the real catalog
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(fn):
+    """
+    run fn once timed and once under tracemalloc.
+
+    returns:
+    - dict with seconds, peak_mb and queries
+    """
+    gc.collect()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+    # tracing slows allocation heavy code down, so memory gets its own run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds, 'peak_mb': peak / 2**20, 'queries': len(queries)}
+
+
+def measure_calls(fn, args):
+    # latency distribution of fn over args, memory and queries from one call
+    stats = measure(lambda: fn(args[0]))
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    stats.update({
+        'calls': len(timings),
+        'seconds': float(timings.sum()),
+        'mean_ms': float(timings.mean() * 1000),
+        'p50_ms': float(np.percentile(timings, 50) * 1000),
+        'p95_ms': float(np.percentile(timings, 95) * 1000),
+        'max_ms': float(timings.max() * 1000),
+    })
+    return stats
+
+
+def format_stats(stage, stats):
+    latency = f"{stats['p50_ms']:>9.1f}ms p50{stats['p95_ms']:>9.1f}ms p95" if 'p50_ms' in stats else ''
+    return f"  {stage:<32}{stats['seconds']:>10.3f}s{stats['peak_mb']:>10.1f} MB{stats['queries']:>6} queries{latency}"
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# bump when templates/book_card.html changes, old entries are never read again
+CARD_VERSION = 1
+
+
+def card_key(book_id):
+    return f'book-card:{CARD_VERSION}:{book_id}'
+
+
+def render_card(book):
+    return render_to_string('book_card.html', {'book': book, 'authors': [a.name for a in book.authors.all()]}).strip()
+
+
+def attach_cards(books):
+    """
+    set card_html on every book, from the cache when possible.
+
+    the missing cards are rendered with one query for their authors and
+    cached for BOOK_CARD_CACHE_TTL, signals drop them when the book, its
+    cover, its authors or its ratings change (library.signals).
+
+    parameters:
+    - books: Books, None entries are skipped
+
+    returns:
+    - books, as a list
+    """
+    books = [book for book in books if book is not None]
+    if not books:
+        return books
+    cached = cache.get_many([card_key(book.id) for book in books])
+    missing = [book for book in books if card_key(book.id) not in cached]
+    if missing:
+        prefetch_related_objects(missing, 'authors')
+        rendered = {card_key(book.id): render_card(book) for book in missing}
+        cache.set_many(rendered, timeout=settings.BOOK_CARD_CACHE_TTL)
+        cached.update(rendered)
+    logger.debug(f'[Book Cards]: {len(books) - len(missing)} cached, {len(missing)} rendered')
+    for book in books:
+        book.card_html = cached[card_key(book.id)]
+    return books
+
+
+def book_card(book):
+    # the card of a single book, attach_cards avoids a cache round trip per book
+    html = getattr(book, 'card_html', None)
+    if html is None:
+        html = attach_cards([book])[0].card_html
+    return html
+
+
+def invalidate_cards(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        cache.delete_many([card_key(book_id) for book_id in book_ids])
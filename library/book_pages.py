@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from library.book_stats import book_stats
+from library.models import Book, Reviews
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# bump when templates/book_details.html or book_review_list.html change
+PAGE_VERSION = 1
+
+
+def page_key(part, book_id):
+    return f'book-page:{PAGE_VERSION}:{part}:{book_id}'
+
+
+def load_book(book_id):
+    return Book.objects.select_related('thumbnail_cover', 'stats').prefetch_related('authors', 'genres').get(id=book_id)
+
+
+def rating_context(book):
+    # the review count is the live BookStats counter
+    if not book.average_rating:
+        return {'average_rating': None, 'num_reviews': 0}
+    return {'average_rating': round(book.average_rating, 2), 'num_reviews': book_stats(book).review_count}
+
+
+def render_details(book):
+    # book page: metadata, ratings and what readers do with the book (BookStats)
+    stats = book_stats(book)
+    return render_to_string('book_details.html', {
+        'book': book,
+        'num_journals': stats.journal_count,
+        'num_reading': stats.reader_count,
+        'num_finished': stats.finished_count,
+        **rating_context(book),
+    })
+
+
+def render_reviews(book):
+    # review aggregation page: metadata, ratings and the approved reviews
+    return render_to_string('book_review_list.html', {
+        'book': book,
+        'reviews': Reviews.objects.filter(book=book, is_approved=True).select_related('user'),
+        **rating_context(book),
+    })
+
+
+PARTS = {
+    'details': render_details,
+    'reviews': render_reviews,
+}
+
+
+def book_page(part, book_id):
+    """
+    the user independent part of a book's page, from the cache when possible.
+
+    signals drop it when the book, its reviews, journals or list memberships
+    change (library.signals), BOOK_PAGE_CACHE_TTL bounds what they miss.
+
+    parameters:
+    - part: 'details' (book page) or 'reviews' (review aggregation page)
+
+    returns:
+    - dict with the book's title, description and cover_url and the
+      rendered html of the part
+
+    raises Book.DoesNotExist for an unknown book_id, like Book.objects.get.
+    """
+    key = page_key(part, book_id)
+    page = cache.get(key)
+    if page is not None:
+        return page
+    book = load_book(book_id)
+    page = {
+        'title': book.title,
+        'description': book.description,
+        'cover_url': book.cover_url,
+        'html': PARTS[part](book),
+    }
+    cache.set(key, page, timeout=settings.BOOK_PAGE_CACHE_TTL)
+    logger.debug(f'[Book Pages]: rendered {part} of book {book_id}')
+    return page
+
+
+def invalidate_pages(book_ids, parts=tuple(PARTS)):
+    book_ids = list(book_ids)
+    if book_ids:
+        cache.delete_many([page_key(part, book_id) for part in parts for book_id in book_ids])
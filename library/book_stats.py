@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.db.models import Count, F
+from library.models import Book, BookStats, Journal, Reviews
+import logging
+
+logger = logging.getLogger('book_journal')
+
+STAT_FIELDS = ['journal_count', 'reader_count', 'finished_count', 'review_count']
+# the lists whose members each counter counts
+LIST_FIELDS = {
+    "Currently Reading": 'reader_count',
+    "Finished": 'finished_count',
+}
+
+
+def add_to_stats(deltas):
+    """
+    add to the counters of books, atomically (F() updates).
+
+    parameters:
+    - deltas: {(book_id, field): amount}, amount may be negative
+
+    one insert for the books without a row yet, then one update per
+    (field, amount) pair however many books there are.
+    """
+    deltas = {key: amount for key, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    # only increments create rows: decrements also run while a book and its
+    # row are being deleted, and a book without a row has nothing to subtract
+    new_ids = {book_id for (book_id, _), amount in deltas.items() if amount > 0}
+    BookStats.objects.bulk_create([BookStats(book_id=book_id) for book_id in new_ids], ignore_conflicts=True)
+    groups = defaultdict(list)
+    for (book_id, field), amount in deltas.items():
+        groups[field, amount].append(book_id)
+    for (field, amount), book_ids in groups.items():
+        BookStats.objects.filter(book_id__in=book_ids).update(**{field: F(field) + amount})
+
+
+def memberships(instance, reverse, pk_set=None):
+    # (book_id, list name, user_id) of the list rows an m2m_changed signal is about
+    rows = Book.list.through.objects.filter(**{'list_id' if reverse else 'book_id': instance.id})
+    if pk_set is not None:
+        rows = rows.filter(**{'book_id__in' if reverse else 'list_id__in': pk_set})
+    return list(rows.filter(list__name__in=LIST_FIELDS).values_list('book_id', 'list__name', 'list__user_id'))
+
+
+def count_memberships(rows, amount):
+    """
+    count the readers and finishers of books added to (1) or removed from
+    (-1) lists, once the list rows are saved or deleted.
+
+    readers and finishers are users, like counted_stats counts them: a user
+    with the book in two lists of the same name changes a counter only with
+    the first list in or the last list out.
+    """
+    changed = Counter(rows)
+    if not changed:
+        return
+    current = Counter(Book.list.through.objects.filter(
+        book_id__in={book_id for book_id, _, _ in changed}, list__name__in=LIST_FIELDS,
+        list__user_id__in={user_id for _, _, user_id in changed},
+    ).values_list('book_id', 'list__name', 'list__user_id'))
+    deltas = Counter()
+    for (book_id, name, user_id), count in changed.items():
+        if current[book_id, name, user_id] == (count if amount > 0 else 0):
+            deltas[book_id, LIST_FIELDS[name]] += amount
+    add_to_stats(deltas)
+
+
+def book_stats(book):
+    # the counters of book, zeros for a book nobody engaged with yet
+    return getattr(book, 'stats', None) or BookStats(book=book)
+
+
+def counted_stats():
+    # {book_id: {field: count}} counted from scratch, books with no engagement left out
+    through = Book.list.through.objects.order_by()
+    counts = {
+        'journal_count': Journal.objects.filter(is_public=True).order_by().values('book_id').annotate(
+            n=Count('id')),
+        'review_count': Reviews.objects.order_by().values('book_id').annotate(n=Count('id')),
+        **{field: through.filter(list__name=name).values('book_id').annotate(n=Count('list__user', distinct=True))
+           for name, field in LIST_FIELDS.items()},
+    }
+    stats = defaultdict(dict)
+    for field, rows in counts.items():
+        for row in rows:
+            stats[row['book_id']][field] = row['n']
+    return stats
+
+
+def rebuild_stats(batch_size=1000):
+    """
+    recount every BookStats row from the journals, reviews and lists.
+
+    returns:
+    - (number of books with engagement, ids of the books whose counters were off)
+    """
+    with transaction.atomic():
+        # counter updates wait until the new rows are in, an update landing
+        # between the count and the rewrite would be lost. postgres: lock the
+        # table (reads go on), sqlite: the delete takes its single write lock
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {BookStats._meta.db_table} IN EXCLUSIVE MODE')
+        old = {row[0]: row[1:] for row in BookStats.objects.values_list('book_id', *STAT_FIELDS)}
+        BookStats.objects.all().delete()
+        rows = [BookStats(book_id=book_id, **counts) for book_id, counts in counted_stats().items()]
+        BookStats.objects.bulk_create(rows, batch_size=batch_size)
+    zeros = (0,) * len(STAT_FIELDS)
+    new = {row.book_id: tuple(getattr(row, field) for field in STAT_FIELDS) for row in rows}
+    drifted = [book_id for book_id in set(old) | set(new) if old.get(book_id, zeros) != new.get(book_id, zeros)]
+    logger.info(f'[Book Stats]: rebuilt counters of {len(rows)} books, {len(drifted)} were off.')
+    return len(rows), drifted
@@ -0,0 +1,213 @@
+from joblib import Parallel, delayed
+from scipy import sparse
+from library.dataset import load_ratings
+from library.model_store import write_artifact, read_artifact, load_artifact, rows_for
+from library.similarity import top_k
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# padded rating slots per block when solving the least squares problems,
+# bounds the (rows, width, k) buffer to a few tens of MB per worker
+MAX_BLOCK_SLOTS = 262144
+
+
+class FactorModel:
+    """
+    user and item factors from alternating least squares, loaded from disk.
+
+    - user_factors / item_factors: float32 arrays, memory-mapped
+    - user_ids / book_ids: sorted ids, row i of the factors belongs to id i
+    - mean: the global mean rating, factors model the residual from it
+    - reg: the regularization used in training, reused to fold in new users
+    """
+
+    def __init__(self, user_factors, item_factors, user_ids, book_ids, mean, reg, path):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = user_ids
+        self.book_ids = book_ids
+        self.mean = mean
+        self.reg = reg
+        self.path = path
+
+
+def rating_matrix(ratings=None):
+    # users x books csr matrix of ratings, plus the ids behind each row/column
+    if ratings is None:
+        ratings = load_ratings()
+    ratings = ratings.dropna(subset=['rating'])
+    ratings = ratings.groupby(['user_id', 'book_id'], as_index=False)['rating'].mean()
+    user_ids = np.unique(ratings['user_id'].values).astype(np.int64)
+    book_ids = np.unique(ratings['book_id'].values).astype(np.int64)
+    rows = np.searchsorted(user_ids, ratings['user_id'].values)
+    cols = np.searchsorted(book_ids, ratings['book_id'].values)
+    matrix = sparse.csr_matrix((ratings['rating'].values.astype(np.float32), (rows, cols)),
+                               shape=(len(user_ids), len(book_ids)))
+    return matrix, user_ids, book_ids
+
+
+def row_blocks(indptr, max_slots=MAX_BLOCK_SLOTS):
+    """
+    group the non-empty rows of a csr matrix into blocks of similar length.
+
+    rows are sorted by their number of ratings so padding every row of a
+    block to the longest one wastes little space, and each block holds at
+    most max_slots padded ratings.
+    """
+    counts = np.diff(indptr)
+    order = np.argsort(counts, kind='stable')
+    order = order[counts[order] > 0]
+    blocks = []
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        # grow the block while rows * width (the last, longest row) fits
+        while stop < len(order) and (stop + 1 - start) * counts[order[stop]] <= max_slots:
+            stop += 1
+        blocks.append(order[start:stop])
+        start = stop
+    return blocks
+
+
+def solve_rows(matrix, fixed, reg, rows):
+    """
+    regularized least squares for the given rows of matrix against the fixed
+    factors. the ratings of each row are packed into a padded (rows, width, k)
+    array so every normal equation of the block is built by one batched matmul
+    and solved by one batched solve.
+    """
+    k = fixed.shape[1]
+    starts = matrix.indptr[rows]
+    counts = matrix.indptr[rows + 1] - starts
+    width = int(counts.max())
+    owner = np.repeat(np.arange(len(rows)), counts)
+    slot = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    source = np.repeat(starts, counts) + slot
+    packed = np.zeros((len(rows), width, k), dtype=np.float32)
+    packed[owner, slot] = fixed[matrix.indices[source]]
+    values = np.zeros((len(rows), width), dtype=np.float32)
+    values[owner, slot] = matrix.data[source]
+    gram = np.matmul(packed.transpose(0, 2, 1), packed)
+    rhs = np.matmul(packed.transpose(0, 2, 1), values[..., None])
+    # weighted-lambda regularization, scaled by the number of ratings
+    gram += (reg * counts)[:, None, None] * np.eye(k, dtype=np.float32)
+    return np.linalg.solve(gram, rhs)[..., 0]
+
+
+def als_step(matrix, fixed, reg, workers=-1):
+    blocks = row_blocks(matrix.indptr)
+    solved = Parallel(n_jobs=workers, prefer='threads')(
+        delayed(solve_rows)(matrix, fixed, reg, rows) for rows in blocks
+    )
+    # rows without any ratings keep a zero factor
+    factors = np.zeros((matrix.shape[0], fixed.shape[1]), dtype=np.float32)
+    for rows, block in zip(blocks, solved):
+        factors[rows] = block
+    return factors
+
+
+def rmse(matrix, user_factors, item_factors, batch=1000000):
+    coo = matrix.tocoo()
+    error = 0.0
+    for i in range(0, coo.nnz, batch):
+        rows, cols = coo.row[i:i + batch], coo.col[i:i + batch]
+        predicted = np.einsum('ij,ij->i', user_factors[rows], item_factors[cols])
+        error += float(np.sum((coo.data[i:i + batch] - predicted) ** 2))
+    return np.sqrt(error / max(coo.nnz, 1))
+
+
+def train_als(matrix, factors=32, reg=0.05, iterations=10, workers=-1, seed=0):
+    """
+    factorize a users x books rating matrix with alternating least squares.
+
+    parameters:
+    - matrix: csr matrix of ratings, missing entries are unobserved
+    - factors: number of latent factors
+    - reg: regularization strength
+    - iterations: number of user/item sweeps
+    - workers: threads solving blocks in parallel (-1 for every core)
+    - seed: seed for the initial item factors
+
+    returns:
+    - (user_factors, item_factors, mean)
+    """
+    mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+    residual = matrix.astype(np.float32, copy=True)
+    residual.data -= mean
+    residual_t = residual.T.tocsr()
+    rng = np.random.default_rng(seed)
+    item_factors = (rng.standard_normal((matrix.shape[1], factors)) * 0.1).astype(np.float32)
+    user_factors = np.zeros((matrix.shape[0], factors), dtype=np.float32)
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        user_factors = als_step(residual, item_factors, reg, workers)
+        item_factors = als_step(residual_t, user_factors, reg, workers)
+        logger.debug(f'[ALS]: iteration {iteration + 1}/{iterations} took {time.perf_counter() - start:.2f}s')
+    logger.info(f'[ALS]: trained {matrix.shape} with {matrix.nnz} ratings, train rmse {rmse(residual, user_factors, item_factors):.4f}')
+    return user_factors, item_factors, mean
+
+
+def save_factors(user_factors, item_factors, user_ids, book_ids, mean, reg):
+    return write_artifact('collaborative', {
+        'user_factors': user_factors.astype(np.float32),
+        'item_factors': item_factors.astype(np.float32),
+        'user_ids': np.asarray(user_ids, dtype=np.int64),
+        'book_ids': np.asarray(book_ids, dtype=np.int64),
+    }, {'mean': mean, 'reg': reg, 'factors': int(item_factors.shape[1])})
+
+
+def read_factors(path):
+    arrays, meta = read_artifact(path, ['user_factors', 'item_factors', 'user_ids', 'book_ids'])
+    return FactorModel(arrays['user_factors'], arrays['item_factors'], arrays['user_ids'],
+                       arrays['book_ids'], meta['mean'], meta['reg'], path)
+
+
+def load_factors():
+    return load_artifact('collaborative', read_factors)
+
+
+def train(factors=32, reg=0.05, iterations=10, workers=-1):
+    matrix, user_ids, book_ids = rating_matrix()
+    if matrix.nnz == 0:
+        logger.warning('[ALS]: no ratings to train on.')
+        return None
+    user_factors, item_factors, mean = train_als(matrix, factors, reg, iterations, workers)
+    path = save_factors(user_factors, item_factors, user_ids, book_ids, mean, reg)
+    logger.info(f'[ALS]: saved factors to {path}')
+    return load_factors()
+
+
+def user_vector(model, user_id, book_ids, ratings):
+    # the trained factor for known users, otherwise fold the user in from
+    # their ratings with one small least squares solve
+    row = rows_for(model.user_ids, [user_id])[0]
+    if row >= 0:
+        return np.asarray(model.user_factors[row])
+    cols = rows_for(model.book_ids, book_ids)
+    known = cols >= 0
+    if not known.any():
+        return None
+    factors = np.asarray(model.item_factors[cols[known]])
+    residual = np.asarray(ratings, dtype=np.float32)[known] - model.mean
+    k = factors.shape[1]
+    gram = factors.T @ factors + model.reg * known.sum() * np.eye(k, dtype=np.float32)
+    return np.linalg.solve(gram, factors.T @ residual)
+
+
+def score_user(model, user_id, book_ids, ratings, top_n=20):
+    """
+    top_n books for a user, as (book_ids, scores) where scores are predicted
+    ratings. books in book_ids (the user's rated books) are never returned.
+    """
+    vector = user_vector(model, user_id, book_ids, ratings)
+    if vector is None:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+    scores = np.asarray(model.item_factors @ vector, dtype=np.float32) + model.mean
+    rated = rows_for(model.book_ids, book_ids)
+    scores[rated[rated >= 0]] = -np.inf
+    top = top_k(scores, top_n)
+    top = top[np.isfinite(scores[top])]
+    return np.asarray(model.book_ids)[top], scores[top]
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.files.base import ContentFile
+from library.models import Book, Covers
+from library.signals import books_changed
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# one keep-alive pool shared by every download thread, sized so no worker
+# waits for a connection
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_maxsize=settings.COVER_DOWNLOAD_WORKERS))
+session.mount('https://', HTTPAdapter(pool_maxsize=settings.COVER_DOWNLOAD_WORKERS))
+
+
+def download(url):
+    # image bytes, None if the download failed. network only, no db access,
+    # so it is safe to run from worker threads
+    try:
+        response = session.get(url, timeout=settings.COVER_DOWNLOAD_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(f'[Image Download]: {url} failed to download.')
+        logger.debug(f'Error:\n{e}')
+        return None
+    if response.status_code != 200:
+        logger.warning(f'[Image Download]: {url} returned {response.status_code}.')
+        return None
+    return response.content
+
+
+def download_all(urls, workers=None):
+    # {url: bytes or None}, at most workers downloads in flight
+    urls = list(urls)
+    if not urls:
+        return {}
+    workers = min(workers or settings.COVER_DOWNLOAD_WORKERS, len(urls))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(urls, pool.map(download, urls)))
+
+
+def fetch_covers(cover_urls, workers=None):
+    """
+    Covers for every url, downloading the ones not in the db yet.
+
+    parameters:
+    - cover_urls: {image url: isbn}, the isbn names the saved file
+    - workers: concurrent downloads, COVER_DOWNLOAD_WORKERS when None
+
+    returns:
+    - {image url: Covers}, urls that failed to download are left out
+
+    downloads run concurrently, the new Covers rows are written together in
+    one bulk_create once every download finished.
+    """
+    covers = {cover.image_url: cover for cover in Covers.objects.filter(image_url__in=cover_urls)}
+    missing = [url for url in cover_urls if url not in covers]
+    new_covers = []
+    for url, content in download_all(missing, workers).items():
+        if content is None:
+            continue
+        cover = Covers(image_url=url)
+        cover.image.save(f'{cover_urls[url]}.png', ContentFile(content), save=False)
+        new_covers.append(cover)
+    # another worker may have saved the same url meanwhile, keep one row
+    Covers.objects.bulk_create(new_covers, update_conflicts=True, unique_fields=['image_url'], update_fields=['image'])
+    covers.update((cover.image_url, cover) for cover in new_covers)
+    logger.info(f'[Image Download]: {len(new_covers)} of {len(missing)} new covers saved.')
+    return covers
+
+
+def ingest_covers(book_ids):
+    """
+    download and attach the covers of pending books.
+
+    books sharing an image url share one download and one Covers row. a
+    failed download counts an attempt, the book stays pending until
+    COVER_MAX_ATTEMPTS and is marked failed after that.
+
+    returns:
+    - ids of the books that should be retried
+    """
+    books = list(Book.objects.filter(id__in=book_ids, cover_status="pending").exclude(cover_image_url=None))
+    cover_urls = {}
+    for book in books:
+        cover_urls.setdefault(book.cover_image_url, book.isbn or book.id)
+    covers = fetch_covers(cover_urls)
+    retry = []
+    for book in books:
+        cover = covers.get(book.cover_image_url)
+        if cover:
+            book.thumbnail_cover = cover
+            book.cover_status = "fetched"
+            continue
+        book.cover_attempts += 1
+        if book.cover_attempts >= settings.COVER_MAX_ATTEMPTS:
+            book.cover_status = "failed"
+            logger.warning(f'[Image Download "{book.title}"]: giving up after {book.cover_attempts} attempts.')
+        else:
+            retry.append(book.id)
+    Book.objects.bulk_update(books, ['thumbnail_cover', 'cover_status', 'cover_attempts'])
+    # bulk_update skips the post_save signal, cached cards and pages still show the remote cover
+    books_changed(book.id for book in books if book.cover_status == "fetched")
+    return retry
@@ -0,0 +1,84 @@
+from itertools import islice
+from django.db.models import Value, CharField
+from library.models import Book, Reviews
+from library.normalize import normalize_corpus
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# rows fetched per round trip when streaming the catalog
+CHUNK_SIZE = 20000
+
+RATINGS_DTYPES = {"user_id": np.int32, "book_id": np.int32, "rating": np.float32}
+BOOKS_DTYPES = {"book_id": np.int32}
+
+
+def stream_frame(rows, columns, dtypes, chunk_size=CHUNK_SIZE):
+    # build a DataFrame chunk by chunk so only one chunk of python tuples is
+    # alive at a time, every chunk is narrowed to the compact dtypes first
+    frames = []
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        frame = pd.DataFrame.from_records(chunk, columns=columns)
+        frames.append(frame.astype(dtypes))
+    if not frames:
+        return pd.DataFrame({col: pd.Series(dtype=dtypes.get(col, object)) for col in columns})
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_ratings(chunk_size=CHUNK_SIZE):
+    rows = Reviews.objects.values_list(
+        'user_id', 'book_id', 'rating', 'created_at'
+    ).order_by().iterator(chunk_size=chunk_size)
+    ratings = stream_frame(rows, ["user_id", "book_id", "rating", "timestamp"], RATINGS_DTYPES, chunk_size)
+    ratings['timestamp'] = pd.to_datetime(ratings['timestamp'], utc=True)
+    return ratings
+
+
+def load_links(book_ids=None, chunk_size=CHUNK_SIZE):
+    # one query over both many-to-many tables: (book_id, name, kind)
+    authors = Book.authors.through.objects.annotate(
+        kind=Value('author', output_field=CharField())
+    ).values_list('book_id', 'authors__name', 'kind')
+    genres = Book.genres.through.objects.annotate(
+        kind=Value('genre', output_field=CharField())
+    ).values_list('book_id', 'genres__genre', 'kind')
+    if book_ids is not None:
+        authors = authors.filter(book_id__in=book_ids)
+        genres = genres.filter(book_id__in=book_ids)
+    rows = authors.union(genres, all=True).iterator(chunk_size=chunk_size)
+    links = stream_frame(rows, ["book_id", "name", "kind"], {"book_id": np.int32, "kind": "category"}, chunk_size)
+    if links.empty:
+        return pd.DataFrame(columns=['author', 'genre'], dtype=object)
+    links = links.groupby(['book_id', 'kind'], observed=True)['name'].agg(" ".join).unstack('kind')
+    return links.reindex(columns=['author', 'genre'])
+
+
+def load_books(book_ids=None, chunk_size=CHUNK_SIZE):
+    all_books = Book.objects.order_by('id')
+    if book_ids is not None:
+        all_books = all_books.filter(id__in=book_ids)
+    rows = all_books.values_list('id', 'title', 'description').iterator(chunk_size=chunk_size)
+    books = stream_frame(rows, ["book_id", "title", "description"], BOOKS_DTYPES, chunk_size)
+    links = load_links(book_ids, chunk_size)
+    books['author'] = books['book_id'].map(links['author']).fillna("").astype('category')
+    books['genre_text'] = books['book_id'].map(links['genre']).fillna("").astype('category')
+    books['description'] = books['description'].fillna("")
+    # normalize each distinct genre combination once
+    categories = books['genre_text'].cat.categories
+    normalized = dict(zip(categories, normalize_corpus(categories)))
+    books['combined_text'] = books['genre_text'].map(normalized).astype(str)
+    books = books[["book_id", "title", "author", "genre_text", "description", "combined_text"]]
+    logger.debug(f'[Dataset]: loaded {len(books)} books ({books.memory_usage(deep=True).sum()} bytes)')
+    return books.reset_index(drop=True)
+
+
+def build_dataset():
+    ratings = load_ratings()
+    books = load_books()
+    return ratings, books
@@ -0,0 +1,130 @@
+import json
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from library.synthetic import FIRST_NAMES, GENRES, LAST_NAMES, WORDS
+
+VOLUMES_PATH = '/books/v1/volumes'
+COVERS_PATH = '/covers/'
+# a 1x1 png served for every cover
+COVER_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082')
+
+
+def fake_volume(query, i, base_url='http://books.example.com'):
+    # a volume shaped like the api's, the same query always returns the same books
+    seed = zlib.crc32(f'{query}|{i}'.encode())
+    isbn = f'979{seed % 10**10:010d}'
+    return {
+        'id': f'fake{seed:x}',
+        'volumeInfo': {
+            'title': f'{query.title()} {WORDS[seed % len(WORDS)].title()} {i + 1}',
+            'authors': [f'{FIRST_NAMES[seed % len(FIRST_NAMES)]} {LAST_NAMES[seed % len(LAST_NAMES)]}'],
+            'categories': [GENRES[seed % len(GENRES)]],
+            'description': f'A book about {query}.',
+            'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': isbn}],
+            'imageLinks': {'thumbnail': f'{base_url}{COVERS_PATH}{isbn}.png'},
+            'pageCount': 100 + seed % 500,
+            'publisher': 'Fake Press',
+            'publishedDate': f'{1950 + seed % 70}-01-01',
+            'printType': 'BOOK',
+            'language': 'en',
+        },
+    }
+
+
+class FakeGoogleBooksHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith(COVERS_PATH):
+            self.send_cover(url.path)
+            return
+        if url.path != VOLUMES_PATH:
+            self.send_error(404)
+            return
+        params = parse_qs(url.query)
+        query = params.get('q', [''])[0]
+        max_results = int(params.get('maxResults', ['10'])[0])
+        start_index = int(params.get('startIndex', ['0'])[0])
+        self.server.requests.append(query)
+        time.sleep(self.server.search_delay)
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        total = self.server.results_per_query
+        items = [fake_volume(query, i, self.server.base_url)
+                 for i in range(start_index, min(start_index + max_results, total))]
+        body = json.dumps({'kind': 'books#volumes', 'totalItems': total, 'items': items}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cover(self, path):
+        self.server.covers.append(path)
+        time.sleep(self.server.cover_delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(COVER_BYTES)))
+        self.end_headers()
+        self.wfile.write(COVER_BYTES)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGoogleBooksServer(ThreadingHTTPServer):
+    """
+    a local stand-in for the google books volume search.
+
+    - requests: every query received, in order
+    - covers: every cover path downloaded, volumes link their covers to this server
+    - cover_delay: seconds each cover download takes
+    - search_delay: seconds each search takes, to simulate a slow upstream
+    - status: set to an error code to make every search fail
+    - results_per_query: volumes every search has, paged with startIndex and maxResults
+
+    use as a context manager to serve from a background thread, url is the
+    value for GOOGLE_BOOKS_API_URL.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, results_per_query=10):
+        super().__init__((host, port), FakeGoogleBooksHandler)
+        self.requests = []
+        self.covers = []
+        self.cover_delay = 0
+        self.search_delay = 0
+        self.status = 200
+        self.results_per_query = results_per_query
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # clients that timed out hang up before the answer is written
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def url(self):
+        return f'{self.base_url}{VOLUMES_PATH}'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+import requests
+from django.conf import settings
+from django.core.cache import caches
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# bump to drop every cached search after a change to what is stored
+CACHE_VERSION = 1
+
+# one keep-alive connection pool for every call to the api
+session = requests.Session()
+
+
+class TokenBucket:
+    """
+    rate limiter: rate tokens per second, up to capacity saved up for bursts.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=0):
+        # take a token, waiting up to timeout seconds for one. False if none came
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    stops calling an upstream that keeps failing.
+
+    after failure_threshold failures in a row the circuit opens and calls are
+    refused for reset_timeout seconds, then one trial call is let through:
+    success closes the circuit again, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def cancel(self):
+        # an allowed call that wasn't made after all, a half open circuit
+        # lets the next one through instead
+        with self.lock:
+            self.trial = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial:
+                    logger.warning(f'[Google Books]: {self.failures} failures in a row, pausing requests '
+                                   f'for {self.reset_timeout}s.')
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+class SingleFlight:
+    """
+    runs a function once per key at a time: callers arriving while it runs
+    wait for that call and share its result instead of making their own.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return future.result()
+
+
+# per process: gunicorn workers each get their own share of the quota
+rate_limiter = TokenBucket(settings.GOOGLE_BOOKS_RATE_LIMIT, settings.GOOGLE_BOOKS_RATE_BURST)
+breaker = CircuitBreaker(settings.GOOGLE_BOOKS_FAILURE_THRESHOLD, settings.GOOGLE_BOOKS_RESET_TIMEOUT)
+in_flight = SingleFlight()
+
+
+def normalize_query(query):
+    # "  Le Guin   Earthsea " and "le guin earthsea" are the same search
+    return ' '.join(query.lower().split())
+
+
+def cache_key(query, max_results, start_index=0):
+    digest = hashlib.sha1(f'{normalize_query(query)}|{max_results}|{start_index}'.encode()).hexdigest()
+    return f'google-books:volumes:{CACHE_VERSION}:{digest}'
+
+
+def slim_volume(item):
+    # only what the book import reads, keeps cache entries small
+    return {'id': item.get('id'), 'volumeInfo': item.get('volumeInfo', {})}
+
+
+def fetch_volumes(query, max_results=40, start_index=0):
+    """
+    search the google books api, no caching.
+
+    parameters:
+    - max_results: volumes per page, at most 40
+    - start_index: position of the first volume, for the following pages
+
+    returns:
+    - list of volumes ({'id', 'volumeInfo'} dicts), None if the request failed
+    """
+    params = {
+        'q': normalize_query(query),
+        'maxResults': max_results,
+        'startIndex': start_index,
+        'orderBy': 'relevance',
+        'printType': 'books',
+    }
+    if settings.GOOGLE_BOOKS_API_KEY:
+        params['key'] = settings.GOOGLE_BOOKS_API_KEY
+    if not breaker.allow():
+        logger.info(f'[Google Books]: upstream degraded, skipping search for "{query}".')
+        return None
+    if not rate_limiter.acquire(timeout=settings.GOOGLE_BOOKS_RATE_LIMIT_WAIT):
+        logger.warning(f'[Google Books]: rate limited, skipping search for "{query}".')
+        breaker.cancel()
+        return None
+    try:
+        response = session.get(settings.GOOGLE_BOOKS_API_URL, params=params,
+                               timeout=(settings.GOOGLE_BOOKS_CONNECT_TIMEOUT, settings.GOOGLE_BOOKS_READ_TIMEOUT))
+        response.raise_for_status()
+        items = response.json().get('items', [])
+    except requests.HTTPError as e:
+        logger.warning(f'[Google Books]: search for "{query}" returned {response.status_code}.')
+        # only the upstream being down or over quota counts towards the breaker
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        logger.debug(f'Error:\n{e}')
+        return None
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f'[Google Books]: search for "{query}" failed.')
+        logger.debug(f'Error:\n{e}')
+        breaker.record_failure()
+        return None
+    breaker.record_success()
+    return [slim_volume(item) for item in items]
+
+
+def search_volumes(query, max_results=40, start_index=0):
+    """
+    google books volumes for query, served from the google_books cache when
+    the same normalized query was searched within GOOGLE_BOOKS_CACHE_TTL.
+
+    concurrent searches for the same page share one api request. failed
+    requests are not cached, an empty result is. while the api keeps failing
+    no requests are made at all and searches only show catalog books.
+
+    returns:
+    - list of volumes ({'id', 'volumeInfo'} dicts), None if the request failed
+    """
+    cache = caches['google_books']
+    key = cache_key(query, max_results, start_index)
+    volumes = cache.get(key)
+    if volumes is not None:
+        logger.debug(f'[Google Books]: cache hit for "{query}".')
+        return volumes
+    return in_flight.do(key, lambda: fetch_and_cache(key, query, max_results, start_index))
+
+
+def fetch_and_cache(key, query, max_results, start_index):
+    volumes = fetch_volumes(query, max_results, start_index)
+    if volumes is not None:
+        caches['google_books'].set(key, volumes, timeout=settings.GOOGLE_BOOKS_CACHE_TTL)
+    return volumes
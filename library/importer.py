@@ -0,0 +1,217 @@
+from datetime import datetime
+from django.db import connection, transaction
+from library.models import Authors, Book, Genres
+from library.search import update_search_vectors
+from library.works import assign_works
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# stored for volumes without a usable published date
+UNKNOWN_DATE = "1111-01-01"
+DATE_FORMATS = ["%Y-%m-%d", "%Y", "%Y-%m"]
+# volume metadata refreshed when an import races another one for the same isbn
+UPSERT_FIELDS = ['title', 'page_count', 'publisher', 'published_date', 'description', 'print_type', 'language']
+
+
+def extract_isbn(volume_info):
+    # isbn-13 if there is one, isbn-10 otherwise
+    identifiers = {i.get('type'): i.get('identifier') for i in volume_info.get('industryIdentifiers', [])}
+    isbn = identifiers.get('ISBN_13') or identifiers.get('ISBN_10')
+    logger.debug(f'[ISBN]: Found {isbn}')
+    return isbn
+
+
+def extract_genre(volume_info):
+    genres = volume_info.get('categories') or ['None']
+    logger.debug(f'[Extracting Genres]: Found genres {genres}')
+    return genres
+
+
+def parse_date(published_date):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(published_date, date_format).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            continue
+    logger.debug(f'[Date Conversion]: couldn\'t parse {published_date!r}, setting to {UNKNOWN_DATE}')
+    return UNKNOWN_DATE
+
+
+def join_values(value, separator):
+    # publisher and language are sometimes lists
+    if isinstance(value, list):
+        return separator.join(str(v) for v in value)
+    return value if isinstance(value, str) else None
+
+
+def fit(value, field, model=Book):
+    # api values longer than the column would make the whole insert fail
+    max_length = model._meta.get_field(field).max_length
+    return value[:max_length] if isinstance(value, str) else value
+
+
+def parse_volume(volume_info):
+    """
+    the Book fields and related names of a google books volumeInfo.
+
+    returns:
+    - dict of Book field values plus 'authors' and 'genres' name lists
+    """
+    print_type = volume_info.get("printType")
+    return {
+        'isbn': fit(extract_isbn(volume_info), 'isbn'),
+        'title': fit(volume_info.get('title') or "Unknown Title", 'title'),
+        'page_count': volume_info.get("pageCount"),
+        'publisher': fit(join_values(volume_info.get("publisher"), ", "), 'publisher'),
+        'published_date': parse_date(volume_info.get("publishedDate")),
+        'description': volume_info.get("description"),
+        'print_type': fit(print_type.lower() if isinstance(print_type, str) else None, 'print_type'),
+        'language': fit(join_values(volume_info.get('language'), " ,"), 'language'),
+        'cover_image_url': volume_info.get('imageLinks', {}).get('thumbnail'),
+        'authors': [fit(name, 'name', Authors) for name in volume_info.get("authors") or ["Unkown Author"]],
+        'genres': [fit(genre, 'genre', Genres) for genre in extract_genre(volume_info)],
+    }
+
+
+def get_or_create_named(model, field, names):
+    # {name: row} for every name, one select plus one upsert for the new ones.
+    # the upsert returns the row another request inserted meanwhile
+    rows = {getattr(row, field): row for row in model.objects.filter(**{f'{field}__in': names})}
+    new_rows = [model(**{field: name}) for name in names if name not in rows]
+    model.objects.bulk_create(new_rows, update_conflicts=True, unique_fields=[field], update_fields=[field])
+    rows.update((getattr(row, field), row) for row in new_rows)
+    return rows
+
+
+def book_fields(fields):
+    # Book field values of parsed fields, covers still have to be downloaded
+    fields = {k: v for k, v in fields.items() if k not in ('authors', 'genres')}
+    fields['cover_status'] = "pending" if fields['cover_image_url'] else None
+    return fields
+
+
+def copy_books(new):
+    """
+    insert new books with postgres COPY through a temp staging table.
+
+    returns:
+    - the inserted Books; isbns another writer inserted first are skipped
+    """
+    new = {isbn: book_fields(fields) for isbn, fields in new.items()}
+    columns = [Book._meta.get_field(name).column for name in next(iter(new.values()))]
+    table = Book._meta.db_table
+    with connection.cursor() as cursor:
+        # same column types as the book table, without its constraints
+        cursor.execute(f'CREATE TEMP TABLE catalog_staging ON COMMIT DROP AS '
+                       f'SELECT {", ".join(columns)} FROM {table} WITH NO DATA')
+        with cursor.copy(f'COPY catalog_staging ({", ".join(columns)}) FROM STDIN') as copy:
+            for fields in new.values():
+                copy.write_row(list(fields.values()))
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}, ratings_count, cover_attempts) '
+            f'SELECT {", ".join(columns)}, 0, 0 FROM catalog_staging '
+            f'ON CONFLICT (isbn) DO NOTHING RETURNING id, isbn')
+        ids = {isbn: book_id for book_id, isbn in cursor.fetchall()}
+        cursor.execute('DROP TABLE catalog_staging')
+    return [Book(id=ids[isbn], **fields) for isbn, fields in new.items() if isbn in ids]
+
+
+def copy_links(through, links):
+    # (book_id, other_id) rows straight into an m2m table
+    columns = [field.column for field in through._meta.fields if field.many_to_one]
+    with connection.cursor() as cursor:
+        with cursor.copy(f'COPY {through._meta.db_table} ({", ".join(columns)}) FROM STDIN') as copy:
+            for link in links:
+                copy.write_row(link)
+
+
+def insert_books(new, use_copy=False):
+    if use_copy:
+        return copy_books(new)
+    new_books = [Book(**book_fields(fields)) for fields in new.values()]
+    # a book another search inserted meanwhile is updated in place
+    Book.objects.bulk_create(new_books, update_conflicts=True, unique_fields=['isbn'], update_fields=UPSERT_FIELDS)
+    return new_books
+
+
+def insert_links(through, links, use_copy=False):
+    if use_copy:
+        copy_links(through, links)
+        return
+    book_field, other_field = [field.attname for field in through._meta.fields if field.many_to_one]
+    through.objects.bulk_create([through(**{book_field: book_id, other_field: other_id}) for book_id, other_id in links],
+                                ignore_conflicts=True)
+
+
+def parse_volumes(volumes):
+    # {isbn: parsed fields} in the order of volumes, volumes without an isbn dropped
+    parsed = {}
+    for volume in volumes:
+        fields = parse_volume(volume.get('volumeInfo', {}))
+        if not fields['isbn']:
+            logger.warning(f'[Book Import "{fields["title"]}"]: no isbn, skipping.')
+            continue
+        parsed.setdefault(fields['isbn'], fields)
+    return parsed
+
+
+def save_parsed(parsed, use_copy=False):
+    """
+    save parsed volumes that aren't in the catalog yet, with their authors,
+    genres, search vectors and works.
+
+    parameters:
+    - parsed: {isbn: fields} from parse_volumes
+    - use_copy: load books and m2m rows with COPY (postgres only), for bulk loads
+
+    returns:
+    - ({isbn: Book} for every parsed isbn that is in the catalog now, number of new books)
+    """
+    with transaction.atomic():
+        books = {book.isbn: book for book in Book.objects.filter(isbn__in=parsed)}
+        new = {isbn: fields for isbn, fields in parsed.items() if isbn not in books}
+        if not new:
+            return books, 0
+        authors = get_or_create_named(Authors, 'name', {n for f in new.values() for n in f['authors']})
+        genres = get_or_create_named(Genres, 'genre', {g for f in new.values() for g in f['genres']})
+        new_books = insert_books(new, use_copy)
+        insert_links(Book.authors.through, [
+            (book.id, authors[name].id) for book in new_books for name in dict.fromkeys(new[book.isbn]['authors'])
+        ], use_copy)
+        insert_links(Book.genres.through, [
+            (book.id, genres[name].id) for book in new_books for name in dict.fromkeys(new[book.isbn]['genres'])
+        ], use_copy)
+        books.update((book.isbn, book) for book in new_books)
+        # bulk inserts skip the signals that keep these up to date
+        new_ids = [book.id for book in new_books]
+        update_search_vectors(new_ids)
+        assign_works(new_ids)
+        works = dict(Book.objects.filter(id__in=new_ids).values_list('id', 'work_id'))
+        for book in new_books:
+            book.work_id = works.get(book.id)
+    return books, len(new_books)
+
+
+def import_volumes(volumes):
+    """
+    save google books volumes as Books, with their authors and genres.
+
+    books already in the catalog (same isbn) are reused, volumes without an
+    isbn are skipped since nothing identifies them on the next search.
+
+    parameters:
+    - volumes: api items, dicts with a 'volumeInfo' key
+
+    returns:
+    - the Books in the order of volumes, without repeats
+
+    the query count doesn't grow with the number of volumes: every lookup is
+    one __in query and every insert one bulk_create.
+    """
+    parsed = parse_volumes(volumes)
+    if not parsed:
+        return []
+    books, inserted = save_parsed(parsed)
+    logger.info(f'[Book Import]: {inserted} new books, {len(parsed) - inserted} already in the catalog.')
+    return [books[isbn] for isbn in parsed if isbn in books]
@@ -0,0 +1,70 @@
+import json
+import random
+import tempfile
+import time
+from functools import partial
+import sklearn
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from library.benchmark import environment, format_stats, measure, measure_calls, test_database
+from library.models import Book, Reviews, User
+from library.recommender import (build_dataset, build_model, content_based_recommendations, get_recommendations,
+                                 load_books, vectorize_books)
+from library.synthetic import SCALES, generate_catalog
+
+
+class Command(BaseCommand):
+    help = "Benchmark the recommender hot path on synthetic catalogs in a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1k', '10k'])
+        parser.add_argument('--queries', type=int, default=50,
+                            help='books/users sampled for the per-request stages')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_recommender.json',
+                            help='where to write the json results')
+
+    def bench_scale(self, scale, options):
+        results = {'scale': scale}
+        start = time.perf_counter()
+        results['rows'] = generate_catalog(SCALES[scale], seed=options['seed'])
+        results['generate_seconds'] = time.perf_counter() - start
+        self.stdout.write(f"{scale}: {results['rows']} generated in {results['generate_seconds']:.1f}s")
+
+        stages = {}
+        stages['build_dataset'] = measure(build_dataset)
+        stages['vectorize_books'] = measure(partial(vectorize_books, load_books()))
+        stages['build_model'] = measure(lambda: build_model(force=True))
+
+        rng = random.Random(options['seed'])
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        book_ids = rng.sample(book_ids, min(options['queries'], len(book_ids)))
+        # the first lookup builds the similarity index, time it on its own
+        stages['similarity_index'] = measure(lambda: get_recommendations(book_ids[0]))
+        stages['get_recommendations'] = measure_calls(get_recommendations, book_ids)
+
+        user_ids = list(Reviews.objects.values_list('user_id', flat=True).distinct())
+        users = list(User.objects.filter(id__in=rng.sample(user_ids, min(options['queries'], len(user_ids)))))
+        stages['content_based_recommendations'] = measure_calls(content_based_recommendations, users)
+
+        for stage, stats in stages.items():
+            self.stdout.write(format_stats(stage, stats))
+        results['stages'] = stages
+        return results
+
+    def handle(self, *args, **options):
+        output = {
+            'meta': environment(sklearn=sklearn.__version__, seed=options['seed'], queries=options['queries']),
+            'results': [],
+        }
+        # every scale runs in a fresh test database with its own model directory
+        with test_database():
+            for scale in options['scales']:
+                call_command('flush', interactive=False, verbosity=0)
+                with tempfile.TemporaryDirectory() as model_dir, override_settings(RECOMMENDER_MODEL_DIR=model_dir):
+                    output['results'].append(self.bench_scale(scale, options))
+
+        with open(options['output'], 'w') as f:
+            json.dump(output, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,86 @@
+import json
+import random
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Case, When, IntegerField, Value, Sum
+from library.benchmark import environment, format_stats, measure, measure_calls, test_database
+from library.models import Authors, Book
+from library.search import search_books, update_search_vectors
+from library.synthetic import SCALES, WORDS, generate_catalog
+
+
+def legacy_search(query):
+    # the OR + join + distinct query home() ran before library.search
+    return Book.objects.filter(
+            Q(title__icontains=query) |
+            Q(authors__name__icontains=query) |
+            Q(isbn__iexact=query) |
+            Q(description__icontains=query)
+    ).annotate(
+        relevance=Sum(Case(
+            When(title__icontains=query, then=Value(3)),
+            When(authors__name__icontains=query, then=Value(2)),
+            When(isbn__iexact=query, then=Value(5)),
+            When(description__icontains=query, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()))).distinct().order_by("-relevance")
+
+
+def sample_queries(n, seed):
+    # a mix of what people type: title words, partial words, author names, isbns
+    rng = random.Random(seed)
+    titles = list(Book.objects.order_by('?').values_list('title', flat=True)[:n])
+    authors = list(Authors.objects.order_by('?').values_list('name', flat=True)[:n])
+    isbns = list(Book.objects.order_by('?').values_list('isbn', flat=True)[:n])
+    queries = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            queries.append(' '.join(titles[i % len(titles)].split()[1:3]))
+        elif kind == 1:
+            queries.append(rng.choice(WORDS[5:])[:4])
+        elif kind == 2:
+            queries.append(authors[i % len(authors)].rsplit(' ', 1)[0])
+        else:
+            queries.append(isbns[i % len(isbns)])
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Benchmark home() book search on synthetic catalogs, legacy query vs library.search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['10k', '100k'])
+        parser.add_argument('--queries', type=int, default=40)
+        parser.add_argument('--limit', type=int, default=50, help='results fetched per query')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_search.json',
+                            help='where to write the json results')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        output = {'meta': environment(seed=options['seed'], queries=options['queries'], limit=limit), 'results': []}
+        with test_database():
+            for scale in options['scales']:
+                call_command('flush', interactive=False, verbosity=0)
+                start = time.perf_counter()
+                rows = generate_catalog(SCALES[scale], seed=options['seed'])
+                self.stdout.write(f'{scale}: {rows} generated in {time.perf_counter() - start:.1f}s')
+                stages = {}
+                stages['update_search_vectors'] = measure(update_search_vectors)
+                if connection.vendor == 'postgresql':
+                    # fresh planner statistics, as autovacuum would have after a real import
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                queries = sample_queries(options['queries'], options['seed'])
+                stages['legacy_search'] = measure_calls(lambda query: list(legacy_search(query)[:limit]), queries)
+                stages['search_books'] = measure_calls(lambda query: list(search_books(query, limit)), queries)
+                for stage, stats in stages.items():
+                    self.stdout.write(format_stats(stage, stats))
+                output['results'].append({'scale': scale, 'rows': rows, 'stages': stages})
+
+        with open(options['output'], 'w') as f:
+            json.dump(output, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand
+from nltk.corpus import stopwords
+from nltk.stem.wordnet import WordNetLemmatizer
+from library.normalize import normalize_corpus
+from library.synthetic import synthetic_corpus
+
+
+def legacy_clean_text(sentence):
+    # the per-book implementation the recommender used before normalize_corpus
+    text = [word for word in sentence.split() if word not in stopwords.words('english')]
+    lemmatizer = WordNetLemmatizer()
+    text = [lemmatizer.lemmatize(word) for word in text]
+    return ' '.join(text).strip().lower()
+
+
+class Command(BaseCommand):
+    help = "Benchmark recommender text normalization (books/sec) on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--text', choices=['genres', 'description'], default='description',
+                            help='long descriptions (nearly all unique) or genre text only (what the recommender '
+                                 'uses, a few dozen distinct strings: mostly measures the dedup)')
+        parser.add_argument('--legacy-sample', type=int, default=2000,
+                            help='number of books timed with the legacy implementation')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='process pool size for the parallel run (0 = cpu count)')
+
+    def report(self, label, texts, seconds):
+        # unique texts/sec is the normalization itself, books/sec includes the dedup
+        n, unique = len(texts), len(set(texts))
+        self.stdout.write(f'{label:<24}{n:>10} books{seconds:>10.3f}s{n / seconds:>14.0f} books/sec'
+                          f'{unique / seconds:>14.0f} unique texts/sec')
+
+    def handle(self, *args, **options):
+        corpus = synthetic_corpus(options['books'], options['text'])
+        sample = corpus[:options['legacy_sample']]
+
+        start = time.perf_counter()
+        legacy = [legacy_clean_text(text) for text in sample]
+        self.report('legacy (per book)', sample, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batched = normalize_corpus(corpus, workers=1)
+        self.report('batched', corpus, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parallel = normalize_corpus(corpus, workers=options['workers'], chunk_size=max(len(set(corpus)) // 32, 1))
+        self.report('batched + process pool', corpus, time.perf_counter() - start)
+
+        if legacy != batched[:len(sample)] or batched != parallel:
+            self.stderr.write(self.style.ERROR('normalized output differs between implementations'))
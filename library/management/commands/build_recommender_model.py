@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.recommender import build_model
+
+
+class Command(BaseCommand):
+    help = "Fit the content-based recommender and save it to RECOMMENDER_MODEL_DIR"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='rebuild even if the catalog has not changed past the threshold')
+
+    def handle(self, *args, **options):
+        model = build_model(force=options['force'])
+        if model is None:
+            self.stdout.write(self.style.WARNING('No books in the catalog, no model built.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommender model {model.path} ({model.matrix.shape[0]} books, catalog {model.version})'))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from library.models import Works
+from library.works import assign_works
+
+
+class Command(BaseCommand):
+    help = "Group every book into works (editions of the same title by the same authors)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='delete existing works and cluster the catalog from scratch')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['reset']:
+            deleted, _ = Works.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted} works')
+        assigned = assign_works()
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned {assigned} books to {Works.objects.count()} works in {time.perf_counter() - start:.1f}s'))
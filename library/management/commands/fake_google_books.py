@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from library.fake_google_books import FakeGoogleBooksServer
+
+
+class Command(BaseCommand):
+    help = "Serve fake Google Books volume searches locally, for working offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--results', type=int, default=10, help='volumes returned per search')
+        parser.add_argument('--delay', type=float, default=0, help='seconds each search takes')
+        parser.add_argument('--status', type=int, default=200, help='status code of every search')
+
+    def handle(self, *args, **options):
+        server = FakeGoogleBooksServer(options['host'], options['port'], options['results'])
+        server.search_delay = options['delay']
+        server.status = options['status']
+        self.stdout.write(f'Set GOOGLE_BOOKS_API_URL={server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
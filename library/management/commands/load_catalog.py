@@ -0,0 +1,64 @@
+import gzip
+import json
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from library.importer import parse_volumes, save_parsed
+from library.tasks import schedule_cover_ingest
+
+
+def read_volumes(path):
+    # one volume per line, {"volumeInfo": {...}} or the bare volumeInfo.
+    # lines are parsed as they are read so memory doesn't grow with the file
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                volume = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'{path}:{number}: {e}')
+            yield volume if 'volumeInfo' in volume else {'volumeInfo': volume}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Load a JSONL dump of Google Books volumes into the catalog in large batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.jsonl file, gzipped when it ends in .gz')
+        parser.add_argument('--batch-size', type=int, default=10000, help='volumes saved per transaction')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='insert with bulk_create even on postgres')
+        parser.add_argument('--ingest-covers', action='store_true',
+                            help='queue cover downloads for the new books')
+
+    def handle(self, *args, **options):
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        start = time.perf_counter()
+        read = inserted = skipped = 0
+        for batch in batches(read_volumes(options['path']), options['batch_size']):
+            parsed = parse_volumes(batch)
+            books, new = save_parsed(parsed, use_copy=use_copy)
+            read += len(batch)
+            inserted += new
+            # no isbn, or the same isbn twice in the batch
+            skipped += len(batch) - len(parsed)
+            if options['ingest_covers'] and new:
+                schedule_cover_ingest(book.id for book in books.values() if book.cover_status == "pending")
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{read} volumes read, {inserted} new books ({read / elapsed:.0f} rows/s)')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {inserted} new books from {read} volumes in {elapsed:.1f}s '
+            f'({read / max(elapsed, 1e-9):.0f} rows/s, {"COPY" if use_copy else "bulk_create"}); '
+            f'{read - inserted - skipped} already in the catalog, {skipped} skipped'))
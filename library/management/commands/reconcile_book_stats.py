@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from library.book_pages import invalidate_pages
+from library.book_stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the journal, reader, finisher and review counters of every book from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='BookStats rows per insert')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        books, drifted = rebuild_stats(batch_size=options['batch_size'])
+        # cached book pages would show the old counts until they expire
+        invalidate_pages(drifted, parts=['details'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {books} books, corrected {len(drifted)} in {time.perf_counter() - start:.1f}s'))
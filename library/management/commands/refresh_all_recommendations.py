@@ -0,0 +1,37 @@
+import os
+import resource
+import time
+from django.core.management.base import BaseCommand
+from library.batch import refresh_all
+
+
+def peak_memory_mb(who):
+    # ru_maxrss is in KB on linux; for children it is the largest child
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = "Recompute content-based recommendations for every user in one batch run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='scoring processes (1 scores in this process)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='users per scoring block, sized from the catalog by default')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        def progress(done, total):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{done}/{total} users ({done / elapsed:.0f} users/sec)')
+
+        users, written = refresh_all(options['top_n'], options['workers'], options['chunk_size'], progress)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {users} users ({written} recommendations) in {elapsed:.1f}s, '
+            f'{users / max(elapsed, 1e-9):.0f} users/sec'))
+        self.stdout.write(
+            f'Peak memory: {peak_memory_mb(resource.RUSAGE_SELF):.0f} MB (main), '
+            f'{peak_memory_mb(resource.RUSAGE_CHILDREN):.0f} MB (largest worker)')
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from library.collaborative import train
+
+
+class Command(BaseCommand):
+    help = "Train the collaborative filtering (ALS) model on all reviews and save the factors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=32)
+        parser.add_argument('--reg', type=float, default=0.05)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=-1,
+                            help='threads used to solve user/item blocks (-1 for every core)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        model = train(options['factors'], options['reg'], options['iterations'], options['workers'])
+        if model is None:
+            self.stdout.write(self.style.WARNING('No ratings, no model trained.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained {len(model.user_ids)} users x {len(model.book_ids)} books '
+            f'in {time.perf_counter() - start:.1f}s -> {model.path}'))
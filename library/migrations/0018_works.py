@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 18:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_user_is_public'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Works',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_key', models.CharField(db_index=True, max_length=500)),
+                ('author_key', models.CharField(db_index=True, max_length=500)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='work',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='editions', to='library.works'),
+        ),
+    ]
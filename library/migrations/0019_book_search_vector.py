@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 18:27
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# gin indexes only exist on postgres, so they are created here instead of in
+# Book.Meta.indexes (sqlite is used for tests)
+CREATE_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS library_book_search_vector_gin ON library_book USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS library_book_title_trgm ON library_book USING gin (title gin_trgm_ops)',
+]
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS library_book_search_vector_gin',
+    'DROP INDEX IF EXISTS library_book_title_trgm',
+]
+# same weights as library.search.search_vector
+BACKFILL = """
+UPDATE library_book b SET search_vector =
+    setweight(to_tsvector('english', coalesce(b.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(a.name, ' ')
+        FROM library_book_authors ba JOIN library_authors a ON a.id = ba.authors_id
+        WHERE ba.book_id = b.id
+    ), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(b.description, '')), 'C')
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(BACKFILL)
+    for sql in CREATE_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_INDEXES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0018_works'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+def mark_fetched_covers(apps, schema_editor):
+    # books imported before covers were fetched in the background
+    Book = apps.get_model('library', 'Book')
+    Book.objects.filter(thumbnail_cover__isnull=False).update(cover_status='fetched')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0019_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('fetched', 'Fetched'), ('failed', 'Failed')], max_length=10, null=True),
+        ),
+        migrations.RunPython(mark_fetched_covers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+# (model, field) pairs made unique by 0022_unique_catalog_fields
+UNIQUE_FIELDS = [
+    ('Genres', 'genre'),
+    ('Authors', 'name'),
+    ('Tags', 'tag'),
+    ('Covers', 'image_url'),
+    ('Book', 'isbn'),
+]
+
+
+def references(apps, model):
+    # every foreign key pointing at model, including the m2m through tables
+    for related in apps.get_models(include_auto_created=True):
+        for field in related._meta.fields:
+            if field.many_to_one and field.remote_field.model is model:
+                yield related, field
+
+
+def repoint(related, field, keep_id, duplicate_ids):
+    if not related._meta.auto_created:
+        related.objects.filter(**{f'{field.attname}__in': duplicate_ids}).update(**{field.attname: keep_id})
+        return
+    # m2m rows: move the links the kept row doesn't have yet, drop the rest
+    other = next(f for f in related._meta.fields if f.many_to_one and f is not field)
+    linked = set(related.objects.filter(**{field.attname: keep_id}).values_list(other.attname, flat=True))
+    rows = related.objects.filter(**{f'{field.attname}__in': duplicate_ids})
+    moved = set(rows.values_list(other.attname, flat=True)) - linked
+    rows.delete()
+    related.objects.bulk_create([related(**{field.attname: keep_id, other.attname: o}) for o in moved])
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    keep the oldest row of every duplicated value and point everything that
+    referenced the others at it, so the unique indexes can be built.
+    """
+    for model_name, field_name in UNIQUE_FIELDS:
+        model = apps.get_model('library', model_name)
+        # blank values would collide just like duplicates, they mean "unknown"
+        if model._meta.get_field(field_name).null:
+            model.objects.filter(**{field_name: ''}).update(**{field_name: None})
+        groups = (model.objects.exclude(**{f'{field_name}__isnull': True}).values(field_name)
+                  .annotate(rows=Count('id'), keep=Min('id')).filter(rows__gt=1).order_by())
+        refs = list(references(apps, model))
+        for group in groups:
+            duplicate_ids = list(model.objects.filter(**{field_name: group[field_name]})
+                                 .exclude(id=group['keep']).values_list('id', flat=True))
+            for related, field in refs:
+                repoint(related, field, group['keep'], duplicate_ids)
+            model.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0020_book_cover_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
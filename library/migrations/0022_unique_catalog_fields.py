@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0021_merge_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authors',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn',
+            field=models.CharField(max_length=50, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='covers',
+            name='image_url',
+            field=models.URLField(null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='genres',
+            name='genre',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tags',
+            name='tag',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# istartswith/icontains compile to UPPER(column::text) LIKE UPPER(...) on
+# postgres, these expression indexes are what library.autocomplete scans.
+# pattern_ops make prefix LIKE use the btree under any collation
+CREATE_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS library_book_title_upper_like ON library_book (UPPER(title::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS library_book_title_upper_trgm ON library_book USING gin (UPPER(title::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS library_authors_name_upper_like ON library_authors (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS library_user_username_upper_like ON library_user (UPPER(username::text) text_pattern_ops) '
+    'WHERE is_public',
+]
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS library_book_title_upper_like',
+    'DROP INDEX IF EXISTS library_book_title_upper_trgm',
+    'DROP INDEX IF EXISTS library_authors_name_upper_like',
+    'DROP INDEX IF EXISTS library_user_username_upper_like',
+]
+
+
+def create_autocomplete_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_autocomplete_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_INDEXES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0022_unique_catalog_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_autocomplete_indexes, drop_autocomplete_indexes),
+    ]
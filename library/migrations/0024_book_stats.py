@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_stats(apps, schema_editor):
+    """
+    fill the counters from the existing journals, reviews and lists, the
+    reconcile_book_stats command recounts them the same way.
+    """
+    BookStats = apps.get_model('library', 'BookStats')
+    Journal = apps.get_model('library', 'Journal')
+    Reviews = apps.get_model('library', 'Reviews')
+    through = apps.get_model('library', 'Book').list.through.objects.order_by()
+    counts = {
+        'journal_count': Journal.objects.filter(is_public=True).order_by().values('book_id').annotate(n=Count('id')),
+        'review_count': Reviews.objects.order_by().values('book_id').annotate(n=Count('id')),
+        'reader_count': through.filter(list__name="Currently Reading").values('book_id').annotate(
+            n=Count('list__user', distinct=True)),
+        'finished_count': through.filter(list__name="Finished").values('book_id').annotate(
+            n=Count('list__user', distinct=True)),
+    }
+    stats = {}
+    for field, rows in counts.items():
+        for row in rows:
+            stats.setdefault(row['book_id'], {})[field] = row['n']
+    BookStats.objects.bulk_create([BookStats(book_id=book_id, **fields) for book_id, fields in stats.items()],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0023_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStats',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='library.book')),
+                ('journal_count', models.IntegerField(default=0)),
+                ('reader_count', models.IntegerField(default=0)),
+                ('finished_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_stats, migrations.RunPython.noop),
+    ]
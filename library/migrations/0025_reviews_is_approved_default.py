@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0024_book_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reviews',
+            name='is_approved',
+            field=models.BooleanField(default=True),
+        ),
+    ]
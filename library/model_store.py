@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import threading
+import time
+import joblib
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db.models import Count, Max
+from library.models import Book
+import logging
+
+logger = logging.getLogger('book_journal')
+
+MANIFEST = 'current.json'
+
+# per-process cache so each worker only loads an artifact once,
+# kind -> (manifest mtime, loaded object)
+_lock = threading.Lock()
+_loaded = {}
+
+
+def model_dir(kind=''):
+    root = str(settings.RECOMMENDER_MODEL_DIR)
+    return os.path.join(root, kind) if kind else root
+
+
+class RecommenderModel:
+    """
+    a fitted TF-IDF model loaded from disk.
+
+    - vectorizer: the fitted TfidfVectorizer (vocabulary + idf weights)
+    - matrix: csr matrix of book vectors, backed by memory-mapped arrays
+    - book_ids: sorted array of Book.id, row i of matrix is book_ids[i]
+    - version: the catalog version stamp the model was built against
+    """
+
+    def __init__(self, vectorizer, matrix, book_ids, version, path):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.book_ids = book_ids
+        self.version = version
+        self.path = path
+        # similarity index, built lazily by library.similarity.get_index
+        self.index = None
+
+    def rows_for(self, book_ids):
+        # map Book.id -> matrix row, -1 for books the model hasn't seen
+        return rows_for(self.book_ids, book_ids)
+
+
+def rows_for(sorted_ids, ids):
+    # positions of ids in a sorted id array, -1 where missing
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    rows = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[rows] == ids, rows, -1)
+
+
+def catalog_version():
+    stamp = Book.objects.aggregate(books=Count('id'), max_id=Max('id'))
+    return {'books': stamp['books'] or 0, 'max_id': stamp['max_id'] or 0}
+
+
+def needs_rebuild(model, version, threshold=None):
+    # rebuild if there is no model or the catalog drifted past the threshold
+    if model is None:
+        return True
+    if threshold is None:
+        threshold = settings.RECOMMENDER_REBUILD_THRESHOLD
+    built = model.version
+    if version['max_id'] < built['max_id'] or version['books'] < built['books']:
+        # books were deleted, rows would point at missing ids
+        return True
+    changed = version['books'] - built['books']
+    return changed > 0 and changed / max(built['books'], 1) >= threshold
+
+
+def write_artifact(kind, arrays, meta, objects=None):
+    """
+    write a new version of an artifact and point the manifest at it.
+
+    parameters:
+    - kind: the artifact name, a sub directory of RECOMMENDER_MODEL_DIR
+    - arrays: name -> numpy array, saved as .npy so readers can mmap them
+    - meta: json serializable metadata
+    - objects: name -> python object, pickled with joblib
+
+    returns:
+    - the path of the new version
+    """
+    root = model_dir(kind)
+    os.makedirs(root, exist_ok=True)
+    name = f'v{time.time_ns()}-{os.getpid()}'
+    path = os.path.join(root, name)
+    tmp_path = path + '.tmp'
+    os.makedirs(tmp_path)
+    for array_name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{array_name}.npy'), array)
+    for object_name, obj in (objects or {}).items():
+        joblib.dump(obj, os.path.join(tmp_path, f'{object_name}.joblib'))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({**meta, 'built_at': time.time()}, f)
+    os.rename(tmp_path, path)
+    # swap the manifest atomically so readers never see a half written model
+    manifest_tmp = os.path.join(root, f'.{name}.json')
+    with open(manifest_tmp, 'w') as f:
+        json.dump({'path': name}, f)
+    os.replace(manifest_tmp, os.path.join(root, MANIFEST))
+    prune_artifacts(kind, keep=2)
+    return path
+
+
+def prune_artifacts(kind, keep=2):
+    # remove all but the newest versions; workers holding an mmap of an old
+    # version keep their file handles until they reload
+    root = model_dir(kind)
+    versions = sorted(d for d in os.listdir(root) if d.startswith('v') and not d.endswith('.tmp'))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def read_artifact(path, arrays, objects=()):
+    loaded = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in arrays}
+    for name in objects:
+        loaded[name] = joblib.load(os.path.join(path, f'{name}.joblib'))
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    return loaded, meta
+
+
+def load_artifact(kind, reader):
+    """
+    return the current version of an artifact, loading it with reader(path)
+    the first time a process sees that version. None if nothing was built.
+    """
+    manifest = os.path.join(model_dir(kind), MANIFEST)
+    try:
+        mtime = os.stat(manifest).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(kind)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _lock:
+        cached = _loaded.get(kind)
+        if not cached or cached[0] != mtime:
+            with open(manifest) as f:
+                name = json.load(f)['path']
+            try:
+                obj = reader(os.path.join(model_dir(kind), name))
+            except (OSError, ValueError) as e:
+                logger.error(f'[Recommender Model]: failed to load {kind}/{name}.')
+                logger.debug(f'Error:\n{e}')
+                return cached[1] if cached else None
+            logger.info(f'[Recommender Model]: loaded {kind}/{name}')
+            cached = (mtime, obj)
+            _loaded[kind] = cached
+    return cached[1]
+
+
+def save_model(vectorizer, matrix, book_ids, version):
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    path = write_artifact('tfidf', {
+        'data': matrix.data,
+        'indices': matrix.indices,
+        'indptr': matrix.indptr,
+        'book_ids': np.asarray(book_ids, dtype=np.int64),
+    }, {'version': version, 'shape': list(matrix.shape)}, {'vectorizer': vectorizer})
+    logger.info(f'[Recommender Model]: saved {matrix.shape} model to {path}')
+    return path
+
+
+def read_model(path):
+    arrays, meta = read_artifact(path, ['data', 'indices', 'indptr', 'book_ids'], ['vectorizer'])
+    matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                               shape=tuple(meta['shape']), copy=False)
+    return RecommenderModel(arrays['vectorizer'], matrix, arrays['book_ids'], meta['version'], path)
+
+
+def load_model():
+    return load_artifact('tfidf', read_model)
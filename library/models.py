@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from PIL import Image
 from io import BytesIO
@@ -100,12 +101,12 @@ class Covers(models.Model):
     # represents the cover image
     image = models.ImageField(upload_to='book_covers/', null=True)
     # represents the url of original image (used to verify if in db or not)
-    image_url = models.URLField(null=True)
+    image_url = models.URLField(null=True, unique=True)
 
 
 class Genres(models.Model):
     # represents the genre (sci-fi, history, historical fiction)
-    genre = models.CharField(max_length=200)
+    genre = models.CharField(max_length=200, unique=True)
 
     def __str__(self):
         return self.genre
@@ -113,7 +114,7 @@ class Genres(models.Model):
 
 class Authors(models.Model):
     # represents the author's name
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
     # datetime.date object representing the date the author was born
     birth_date = models.DateField(null=True, blank=True)
     # datetime.date object representing the date the author died
@@ -125,6 +126,18 @@ class Authors(models.Model):
         return self.name
 
 
+class Works(models.Model):
+    # a work groups every edition of the same book (hardcover, paperback,
+    # anniversary edition...), see library.works
+    # normalized title with subtitles and edition words removed
+    title_key = models.CharField(max_length=500, db_index=True)
+    # sorted author surnames
+    author_key = models.CharField(max_length=500, db_index=True)
+
+    def __str__(self):
+        return self.title_key
+
+
 class Book(models.Model):
     # foreign key linking to Genres.id representing the main genre of the book
     main_genre = models.ForeignKey(Genres, on_delete=models.CASCADE, null=True, blank=True)
@@ -132,6 +145,13 @@ class Book(models.Model):
     # foreign key linking to Covers.id representing the thumbnail cover
     thumbnail_cover = models.ForeignKey(Covers, on_delete=models.CASCADE, default=None, null=True, blank=True)
     cover_image_url = models.URLField(null=True)
+    # where the local copy of cover_image_url is: being downloaded by the
+    # ingest_covers task, saved as thumbnail_cover, or given up on
+    cover_status = models.CharField(max_length=10,
+                                    choices=[("pending", "Pending"), ("fetched", "Fetched"), ("failed", "Failed")],
+                                    null=True, blank=True)
+    # integer representing the number of failed cover downloads
+    cover_attempts = models.IntegerField(default=0)
     covers = models.ManyToManyField(Covers, related_name="covers", default=None)
     authors = models.ManyToManyField(Authors, related_name="authors", default=None)
     # foreign key linking to List.id representing the list the book is in
@@ -155,11 +175,41 @@ class Book(models.Model):
     # represents the language the book is published in
     language = models.CharField(max_length=200, null=True, blank=True)
     # represents the isbn of the book
-    isbn = models.CharField(max_length=50, null=True)
+    isbn = models.CharField(max_length=50, null=True, unique=True)
+    # foreign key linking to Works.id, shared by every edition of the book
+    work = models.ForeignKey(Works, on_delete=models.SET_NULL, null=True, blank=True, related_name="editions")
+    # weighted title/author/description vector for full text search, kept up
+    # to date by library.signals (postgres only, see library.search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.title
 
+    @property
+    def cover_url(self):
+        # the local copy once it is downloaded, the remote thumbnail until then
+        if self.thumbnail_cover_id and self.thumbnail_cover.image:
+            return self.thumbnail_cover.image.url
+        return self.cover_image_url
+
+
+# data model for the engagement counters shown on a book's page, kept up to
+# date by library.signals and rebuilt by the reconcile_book_stats command
+class BookStats(models.Model):
+    # the book the counters belong to, a book without a row has no engagement yet
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    # integer representing the number of public journal entries
+    journal_count = models.IntegerField(default=0)
+    # integer representing the number of users currently reading the book
+    reader_count = models.IntegerField(default=0)
+    # integer representing the number of users who finished the book
+    finished_count = models.IntegerField(default=0)
+    # integer representing the number of reviews
+    review_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.book_id}: {self.reader_count} reading, {self.finished_count} finished'
+
 
 # data model for a user created journal entry
 class Journal(models.Model):
@@ -212,7 +262,7 @@ class UserRecommendations(models.Model):
 
 class Tags(models.Model):
     # represents the tag text
-    tag = models.CharField(max_length=200)
+    tag = models.CharField(max_length=200, unique=True)
 
     def __str__(self):
         return self.tag
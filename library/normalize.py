@@ -0,0 +1,80 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from nltk.corpus import stopwords
+from nltk.stem.wordnet import WordNetLemmatizer
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# catalogs smaller than this are normalized in-process, a pool costs more
+# to start than it saves
+PARALLEL_THRESHOLD = 200000
+
+# built once per process, shared by every book
+_stopwords = None
+_lemmatizer = None
+_lemmas = {}
+
+
+def stopword_set():
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = frozenset(stopwords.words('english'))
+    return _stopwords
+
+
+def lemmatize(word):
+    # memoized lemma table, catalogs reuse a small vocabulary of genre words
+    lemma = _lemmas.get(word)
+    if lemma is None:
+        global _lemmatizer
+        if _lemmatizer is None:
+            _lemmatizer = WordNetLemmatizer()
+        lemma = _lemmatizer.lemmatize(word)
+        _lemmas[word] = lemma
+    return lemma
+
+
+def normalize_text(sentence):
+    stop = stopword_set()
+    text = [lemmatize(word) for word in sentence.split() if word not in stop]
+    return ' '.join(text).strip().lower()
+
+
+def can_start_pool():
+    # daemonic processes (celery prefork workers) can't have children
+    return not multiprocessing.current_process().daemon
+
+
+def _normalize_chunk(texts):
+    return [normalize_text(text) for text in texts]
+
+
+def normalize_corpus(texts, workers=None, chunk_size=10000):
+    """
+    normalize every text in the corpus in one pass.
+
+    parameters:
+    - texts: an iterable of raw strings, one per book
+    - workers: size of the process pool; None normalizes in-process unless
+      the corpus is larger than PARALLEL_THRESHOLD. always in-process inside
+      a daemonic process (a celery prefork worker)
+    - chunk_size: number of unique texts sent to a pool worker at a time
+
+    returns:
+    - a list of normalized strings in the same order as texts
+    """
+    texts = list(texts)
+    # many books share the same genre text, only normalize each one once
+    unique = list(dict.fromkeys(texts))
+    if workers is None and len(unique) >= PARALLEL_THRESHOLD:
+        workers = 0  # let the pool pick os.cpu_count()
+    if workers is None or workers == 1 or len(unique) < chunk_size or not can_start_pool():
+        normalized = _normalize_chunk(unique)
+    else:
+        chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers or None) as pool:
+            normalized = [text for chunk in pool.map(_normalize_chunk, chunks) for text in chunk]
+    logger.debug(f'[Normalize]: {len(texts)} texts ({len(unique)} unique) normalized')
+    table = dict(zip(unique, normalized))
+    return [table[text] for text in texts]
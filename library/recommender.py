@@ -1,11 +1,14 @@
-from library.models import Book, Reviews
+from django.db import transaction
+from library.models import Book, Reviews, UserRecommendations
+from library.normalize import normalize_text
+from library.dataset import build_dataset, load_books  # noqa: F401
+from library.similarity import get_index
+from library.collaborative import load_factors, score_user
+from library.model_store import load_model, save_model, catalog_version, needs_rebuild
 import numpy as np
 import pandas as pd
-from nltk.corpus import stopwords
-from nltk.stem.wordnet import WordNetLemmatizer
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
-from difflib import SequenceMatcher
 import logging
 # import matplotlib.pyplot as plt
 # import seaborn as sns
@@ -14,110 +17,172 @@ logger = logging.getLogger('book_journal')
 
 
 def clean_text(sentence):
-    text = [word for word in sentence.split() if word not in stopwords.words('english')]
-    lemmatizer = WordNetLemmatizer()
-    text = [lemmatizer.lemmatize(word) for word in text]
-    return ' '.join(text).strip().lower()
-
-
-def build_dataset():
-    all_user_reviews = Reviews.objects.all()
-    all_books = Book.objects.all()
-    # build the ratings DataFrame
-    ratings_cols = ["user_id", "book_id", "rating", "timestamp"]
-    ratings_lst = []
-    for review in all_user_reviews:
-        ratings_lst.append([review.user.id, review.book.id, review.rating, review.created_at])
-    ratings = pd.DataFrame(ratings_lst, columns=ratings_cols)
-    # build the books DataFrame
-    book_cols = ["book_id", "title", "author", "genre_text", "description", "combined_text"]
-    book_lst = []
-
-    for book in all_books:
-        book_id = book.id
-        title = book.title
-        authors = [author.name for author in book.authors.all()]
-        author = " ".join(authors)
-        description = book.description if book.description else ""
-        genres = [genre.genre for genre in book.genres.all()]
-        genre_text = " ".join(genres)
-        combined_text = f'{genre_text}'
-        combined_text = clean_text(combined_text)
-        book_lst.append([book_id, title, author, genre_text, description, combined_text])
-    books = pd.DataFrame(book_lst, columns=book_cols)
-    books = books.reset_index(drop=True)
-    return ratings, books
+    return normalize_text(sentence)
 
 
 def vectorize_books(books_df):
-    tfidf = TfidfVectorizer(stop_words='english')
+    tfidf = TfidfVectorizer(stop_words='english', dtype=np.float32)
     tfidf_matrix = tfidf.fit_transform(books_df['combined_text'])
     return tfidf_matrix, tfidf
 
 
-def get_recommendations(title, books_df, tfidf_matrix, top_n=5):
-    idxs = pd.Series(books_df.index, index=books_df['title']).drop_duplicates()
-    if title not in idxs:
-        return []
-    idx = books_df[books_df['title'] == title].index[0]
-    cosine_similarities = linear_kernel(tfidf_matrix[idx], tfidf_matrix).flatten()
-    similar_indices = [i for i in cosine_similarities.argsort()[::-1] if i != idx][:top_n]
-    logger.debug(f'similar_indices:{similar_indices}')
-    logger.debug(f'books_df.shape: {books_df.shape})')
-    top_books = books_df.iloc[similar_indices]
-    return top_books[['title']], cosine_similarities[similar_indices]
-
-
-def is_similar(title1, title2, threshold=0.8):
-    return SequenceMatcher(None, title1.lower(), title2.lower()).ratio() >= threshold
-
-
-def content_based_recommendations(user):
-    ratings_df, books_df = build_dataset()
+def build_model(force=False):
+    # fit the vectorizer over the whole catalog and persist it to disk
+    version = catalog_version()
+    if not force and not needs_rebuild(load_model(), version):
+        logger.debug(f'[Recommender Model]: catalog {version} within threshold, skipping rebuild.')
+        return load_model()
+    books_df = load_books()
+    if books_df.empty:
+        logger.warning('[Recommender Model]: no books in catalog, nothing to build.')
+        return None
     tfidf_matrix, tfidf = vectorize_books(books_df)
+    save_model(tfidf, tfidf_matrix, books_df['book_id'].values, version)
+    return load_model()
+
+
+def get_model():
+    # reuse the worker's loaded model, only refitting once the catalog drifted
+    model = load_model()
+    if needs_rebuild(model, catalog_version()):
+        model = build_model(force=True)
+    return model
+
+
+def book_vectors(model, book_ids):
+    # rows from the saved matrix, books added since the last build are
+    # transformed with the saved vocabulary instead of forcing a refit
+    rows = model.rows_for(book_ids)
+    missing = [book_id for book_id, row in zip(book_ids, rows) if row < 0]
+    vectors = model.matrix[np.maximum(rows, 0)]
+    if missing:
+        new_books = load_books(book_ids=missing).set_index('book_id')
+        texts = [new_books['combined_text'].get(book_id, '') for book_id in book_ids]
+        vectors = sparse.vstack([
+            model.vectorizer.transform([texts[i]]) if row < 0 else vectors[i]
+            for i, row in enumerate(rows)
+        ]).tocsr()
+    return vectors
+
+
+def get_recommendations(book_id, top_n=5):
+    # books most similar to book_id, as (book_ids, scores)
+    model = get_model()
+    if model is None:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+    book_ids, scores = get_index(model).query(book_id, top_n)
+    logger.debug(f'similar books to {book_id}: {book_ids}')
+    return book_ids, scores
+
+
+def drop_same_works(book_ids, scores, rated_book_ids):
+    """
+    drop other editions of books the user rated, keep only the best scoring
+    edition of every recommended work and drop books deleted since scoring.
+
+    returns:
+    - (book_ids, scores) arrays, still best first
+    """
+    works = dict(Book.objects.filter(id__in=[*book_ids, *rated_book_ids]).values_list('id', 'work_id'))
+    seen = {works[book_id] for book_id in rated_book_ids if works.get(book_id)}
+    keep = []
+    for i, book_id in enumerate(book_ids):
+        if book_id not in works:
+            continue
+        work_id = works[book_id]
+        if work_id is not None:
+            if work_id in seen:
+                continue
+            seen.add(work_id)
+        keep.append(i)
+    return np.asarray(book_ids, dtype=np.int64)[keep], np.asarray(scores, dtype=np.float32)[keep]
+
+
+def no_recommendations():
+    return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+
+def content_based_recommendations(user, top_n=20):
+    """
+    books for user from the rating weighted average of their books' vectors.
+
+    returns:
+    - (book_ids, scores) arrays, best first
+    """
+    model = get_model()
+    if model is None:
+        return no_recommendations()
 
     # filter ratings by this user
-    user_ratings = ratings_df[ratings_df['user_id'] == user.id]
+    user_ratings = pd.DataFrame(
+        list(Reviews.objects.filter(user=user).values_list('book_id', 'rating')),
+        columns=['book_id', 'rating'])
     if user_ratings.empty:
-        return pd.DataFrame(), []
-
-    # filter books already read
-    rated_books = user_ratings['book_id'].values
-    rated_indices = books_df[books_df['book_id'].isin(rated_books)].index
-    rated_book_ids = set(user_ratings['book_id'].values)
-    rated_books_info = books_df[books_df['book_id'].isin(rated_book_ids)][['book_id', 'title']]
-    logger.debug(f'Rated books by user:\n{rated_books_info}')
-    rated_titles = books_df[books_df['book_id'].isin(rated_book_ids)]['title'].tolist()
-
-    # get user tfidf vectors for those books
-    user_tfidfs = tfidf_matrix[rated_indices]
-
-    # weight them by users rating
-    book_ids_in_order = books_df.loc[rated_indices, 'book_id'].values
-    ratings_dict = user_ratings.set_index('book_id')['rating'].to_dict()
-    ratings = np.array([ratings_dict.get(book_id, 0) for book_id in book_ids_in_order], dtype=float)
+        return no_recommendations()
+    user_ratings = user_ratings.groupby('book_id', as_index=False)['rating'].mean()
+    rated_book_ids = user_ratings['book_id'].values
+
+    # get user tfidf vectors for those books, weighted by the user's rating
+    user_tfidfs = book_vectors(model, rated_book_ids)
+    ratings = user_ratings['rating'].fillna(0).values.astype(np.float32)
     logger.debug(f'user_tfidfs shape: {user_tfidfs.shape}')
     logger.debug(f'ratings shape: {ratings.shape}')
-    user_profile = np.average(user_tfidfs.toarray(), axis=0, weights=ratings)
-
-    # compute similarity with all books
-    cosine_similarities = linear_kernel([user_profile], tfidf_matrix).flatten()
-
-    # exclude books user has already rated
-    exclude_mask = books_df['book_id'].isin(rated_book_ids)
-    cosine_similarities[np.where(exclude_mask)[0]] = -1
-
-    # get top N
-    top_indices = cosine_similarities.argsort()[::-1][:20]
-    book_recs = books_df.iloc[top_indices]
-    logger.debug(f'Top recommendations before deduplication:\n{book_recs[['book_id', 'title']]}')
-    # apply similarity filter to filter books by title further
-    book_recs = book_recs[~book_recs['title'].apply(
-        lambda rec_title: any(is_similar(rec_title, rated_title, 0.5) for rated_title in rated_titles)
-    )]
-    logger.debug(f'book_recs:{book_recs}')
-    return book_recs[['title']], cosine_similarities[top_indices]
-
-
-def collaborative_recommendatiions(user):
-    return None
+    if ratings.sum() == 0:
+        ratings = np.ones_like(ratings)
+    user_profile = user_tfidfs.T.dot(ratings) / ratings.sum()
+
+    # top N most similar books, excluding books the user already rated
+    rated_rows = model.rows_for(rated_book_ids)
+    top_indices, top_scores = get_index(model).query_vector(user_profile, top_n, rated_rows[rated_rows >= 0])
+    top_ids = model.book_ids[top_indices]
+    logger.debug(f'Top recommendations before deduplication:\n{top_ids}')
+    # other editions of the same work are not new books for this user
+    book_ids, scores = drop_same_works(top_ids, top_scores, rated_book_ids)
+    logger.debug(f'book_recs:{book_ids}')
+    return book_ids, scores
+
+
+def collaborative_recommendations(user, top_n=20):
+    """
+    books for user from the ALS factor model.
+
+    returns:
+    - (book_ids, scores) arrays, best first
+    """
+    model = load_factors()
+    user_ratings = list(Reviews.objects.filter(user=user, rating__isnull=False).values_list('book_id', 'rating'))
+    if model is None or not user_ratings:
+        return no_recommendations()
+    rated_book_ids, ratings = zip(*user_ratings)
+    top_ids, scores = score_user(model, user.id, rated_book_ids, ratings, top_n)
+    book_ids, scores = drop_same_works(top_ids, scores, rated_book_ids)
+    logger.debug(f'collaborative book_recs:{book_ids}')
+    return book_ids, scores
+
+
+def user_recommendations(user, top_n=20):
+    """
+    books for user from the ALS factor model once train_collaborative_model
+    has run and knows some of the user's books, content based otherwise.
+
+    returns:
+    - (book_ids, scores) arrays, best first. scores only rank one user's books:
+      predicted ratings for the factor model, similarities otherwise
+    """
+    book_ids, scores = collaborative_recommendations(user, top_n)
+    if len(book_ids):
+        return book_ids, scores
+    return content_based_recommendations(user, top_n)
+
+
+def save_recommendations(user, book_ids, scores):
+    # swap in the new set in one transaction so readers always see either
+    # the old recommendations or the new ones, never an empty list
+    recommendations = [
+        UserRecommendations(user=user, book_id=int(book_id), score=float(score))
+        for book_id, score in zip(book_ids, scores)
+    ]
+    with transaction.atomic():
+        UserRecommendations.objects.filter(user=user).delete()
+        UserRecommendations.objects.bulk_create(recommendations)
+    return len(recommendations)
@@ -0,0 +1,145 @@
+import re
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Q, Subquery, Value, When
+from library.models import Book
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# text search configuration used for both the stored vectors and the queries
+SEARCH_CONFIG = 'english'
+# how much a fuzzy title match counts next to the full text rank
+TRIGRAM_WEIGHT = 0.5
+# rows updated per statement when backfilling search vectors
+BATCH_SIZE = 5000
+
+# relevance of each field on the fallback path, mirrors the A/B/C weights
+FALLBACK_WEIGHTS = {'isbn': 5, 'title': 3, 'author': 2, 'description': 1}
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    # title (A) > author names (B) > description (C)
+    authors = Book.authors.through.objects.filter(book_id=OuterRef('pk')).order_by().values('book_id').annotate(
+        names=StringAgg('authors__name', delimiter=' ')).values('names')
+    return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(authors), weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG))
+
+
+def update_search_vectors(book_ids=None, batch_size=BATCH_SIZE):
+    """
+    recompute the stored search vector of the given books, every book when None.
+
+    returns:
+    - number of books updated, always 0 outside postgres
+    """
+    if not uses_postgres():
+        return 0
+    if book_ids is None:
+        book_ids = Book.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    book_ids = list(book_ids)
+    updated = 0
+    for start in range(0, len(book_ids), batch_size):
+        updated += Book.objects.filter(id__in=book_ids[start:start + batch_size]).update(search_vector=search_vector())
+    logger.debug(f'[Search]: updated {updated} search vectors')
+    return updated
+
+
+def prefix_query(query):
+    # "harry pott" -> "harry:* & pott:*", only word characters reach to_tsquery
+    return ' & '.join(f'{term}:*' for term in re.findall(r'\w+', query.lower()))
+
+
+def matching_books(query):
+    # every book matching query, annotated with rank, unordered
+    if uses_postgres():
+        books = postgres_search(query)
+    else:
+        books = fallback_search(query)
+    # the stored vector is only needed inside the database
+    return books.defer('search_vector')
+
+
+def search_books(query, limit=50):
+    """
+    books matching query, best match first.
+
+    parameters:
+    - query: free text typed by the user, matched against title, authors,
+      description and isbn
+    - limit: maximum number of books returned
+
+    returns:
+    - a Book queryset annotated with rank
+    """
+    query = query.strip()
+    if not query:
+        return Book.objects.none()
+    return matching_books(query).order_by('-rank', 'id')[:limit]
+
+
+def search_page(query, after=None, max_id=None, page_size=20):
+    """
+    one page of search_books, continuing after the last book of the previous
+    page (keyset pagination), so deep pages cost as much as the first one.
+
+    parameters:
+    - after: (rank, id) of the last book already shown, None for the first page
+    - max_id: only books with an id up to this one, keeps pages stable while
+      searches import new books
+    - page_size: books per page
+
+    returns:
+    - (list of Books, (rank, id) to pass as after for the next page or None
+      if this was the last page)
+    """
+    query = query.strip()
+    if not query:
+        return [], None
+    books = matching_books(query)
+    if max_id is not None:
+        books = books.filter(id__lte=max_id)
+    if after is not None:
+        rank, book_id = after
+        books = books.filter(Q(rank__lt=rank) | Q(rank=rank, id__gt=book_id))
+    # one extra row tells whether there is a next page
+    books = list(books.order_by('-rank', 'id')[:page_size + 1])
+    if len(books) <= page_size:
+        return books, None
+    books = books[:page_size]
+    return books, (books[-1].rank, books[-1].id)
+
+
+def postgres_search(query):
+    # full text match on the stored vector (gin index), fuzzy title match
+    # (title trigram index) and exact isbn
+    matches = Q(isbn=query) | Q(title__trigram_word_similar=query)
+    rank = (Case(When(isbn=query, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+            + TrigramWordSimilarity(query, 'title') * TRIGRAM_WEIGHT)
+    terms = prefix_query(query)
+    if terms:
+        search_query = SearchQuery(terms, search_type='raw', config=SEARCH_CONFIG)
+        matches |= Q(search_vector=search_query)
+        rank = rank + SearchRank(F('search_vector'), search_query)
+    return Book.objects.filter(matches).annotate(rank=rank)
+
+
+def fallback_search(query):
+    # substring search for databases without full text search (sqlite in
+    # tests). authors are matched with EXISTS so books with several
+    # authors are neither duplicated nor need distinct()
+    author_match = Book.authors.through.objects.filter(book_id=OuterRef('pk'), authors__name__icontains=query)
+    hits = {
+        'isbn': Q(isbn__iexact=query),
+        'title': Q(title__icontains=query),
+        'author': Q(author_match=True),
+        'description': Q(description__icontains=query),
+    }
+    rank = sum(Case(When(hit, then=Value(FALLBACK_WEIGHTS[field])), default=Value(0)) for field, hit in hits.items())
+    return Book.objects.annotate(author_match=Exists(author_match), rank=rank).filter(rank__gt=0)
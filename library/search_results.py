@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.core import signing
+from django.db.models import Max, prefetch_related_objects
+from library.covers import ingest_covers
+from library.google_books import normalize_query, search_volumes
+from library.importer import import_volumes
+from library.models import Book
+from library.search import matching_books, search_page
+from library.tasks import schedule_cover_ingest
+from library.works import dedupe_by_work
+import logging
+
+logger = logging.getLogger('book_journal')
+
+CURSOR_SALT = 'library.search_results'
+# the api returns at most 40 volumes per request
+API_MAX_RESULTS = 40
+
+
+def encode_cursor(state):
+    return signing.dumps(state, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, query):
+    # the state of a cursor made for this query, None (first page) for a
+    # missing, tampered or stale one
+    if not cursor:
+        return None
+    try:
+        state = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        logger.debug(f'[Search]: ignoring invalid cursor for "{query}".')
+        return None
+    if state.get('q') != normalize_query(query):
+        return None
+    return state
+
+
+def download_pending(books):
+    """
+    download the missing covers of books about to be shown, unless a worker
+    downloads them (COVER_DOWNLOAD_IN_BACKGROUND).
+
+    returns:
+    - books, reloaded with their new covers when any were downloaded
+    """
+    pending = [book.id for book in books if book.cover_status == "pending" and book.cover_image_url]
+    if not pending or settings.COVER_DOWNLOAD_IN_BACKGROUND:
+        return books
+    # download every missing cover at once, search latency follows the slowest image
+    ingest_covers(pending)
+    saved = Book.objects.in_bulk([book.id for book in books])
+    return [saved[book.id] for book in books]
+
+
+def import_page(query, start_index, max_results):
+    """
+    import one page of google books volumes for query.
+
+    returns:
+    - (imported Books, start_index of the next page or None after the last one)
+    """
+    volumes = search_volumes(query, max_results=max_results, start_index=start_index)
+    if volumes is None:
+        return [], None
+    books = download_pending(import_volumes(volumes))
+    # covers still missing are downloaded (or retried) by a worker
+    schedule_cover_ingest(book.id for book in books if book.cover_status == "pending")
+    # a short page is the last one, volumes without an isbn still count
+    next_index = start_index + max_results if len(volumes) == max_results else None
+    return books, next_index
+
+
+def page_books(books):
+    # one edition of every work, with the covers the results show in one query
+    books = dedupe_by_work(books)
+    prefetch_related_objects(books, 'thumbnail_cover')
+    return books
+
+
+def results_page(query, cursor=None, page_size=None):
+    """
+    one page of search results: books already in the catalog first, paged
+    with (rank, id) keyset cursors, then google books volumes paged with
+    startIndex, fetched only once the catalog matches run out.
+
+    parameters:
+    - query: the search box text
+    - cursor: next_cursor of the previous page, None for the first page
+    - page_size: books per page, SEARCH_PAGE_SIZE by default
+
+    returns:
+    - (list of Books, one edition per work, cursor of the next page or None)
+    """
+    page_size = page_size or settings.SEARCH_PAGE_SIZE
+    state = decode_cursor(cursor, query)
+    if state is None:
+        # books imported after the first page show up in the api pages instead
+        state = {'q': normalize_query(query), 'max_id': Book.objects.aggregate(max_id=Max('id'))['max_id'] or 0}
+
+    books = []
+    if 'start' not in state:
+        after = (state['rank'], state['id']) if 'id' in state else None
+        books, after = search_page(query, after=after, max_id=state['max_id'], page_size=page_size)
+        # catalog books whose earlier downloads failed, or were left to a worker
+        # that isn't running, get their covers when a search shows them
+        books = download_pending(books)
+        if after is not None:
+            return page_books(books), encode_cursor({**state, 'rank': after[0], 'id': after[1]})
+        state = {'q': state['q'], 'max_id': state['max_id'], 'start': 0}
+
+    if len(books) == page_size:
+        # the last catalog page was full, the api starts on the next one
+        return page_books(books), encode_cursor(state)
+    # the catalog matches ran out, fill the page from the api
+    imported, next_index = import_page(query, state['start'], min(page_size - len(books), API_MAX_RESULTS))
+    # skip books the catalog pages already showed
+    shown = set(matching_books(query).filter(id__in=[book.id for book in imported], id__lte=state['max_id'])
+                .values_list('id', flat=True))
+    shown.update(book.id for book in books)
+    books += [book for book in imported if book.id not in shown]
+    next_cursor = encode_cursor({**state, 'start': next_index}) if next_index is not None else None
+    return page_books(books), next_cursor
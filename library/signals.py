@@ -0,0 +1,159 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from library.book_cards import invalidate_cards
+from library.book_pages import invalidate_pages
+from library.book_stats import LIST_FIELDS, add_to_stats, count_memberships, memberships
+from library.models import Authors, Book, Covers, Journal, List, Reviews, User
+from library.search import update_search_vectors
+
+
+def books_changed(book_ids):
+    # everything cached about the books: cards and pages
+    book_ids = list(book_ids)
+    invalidate_cards(book_ids)
+    invalidate_pages(book_ids)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    books_changed([instance.id])
+    if update_fields and not {'title', 'description'} & set(update_fields):
+        return
+    update_search_vectors([instance.id])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    books_changed([instance.id])
+
+
+@receiver(post_save, sender=Covers)
+def cover_saved(sender, instance, created, **kwargs):
+    if not created:
+        books_changed(instance.book_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+def review_changed(sender, instance, created=False, **kwargs):
+    # cards and pages show the average rating, the review page lists reviews
+    if created or kwargs['signal'] is post_delete:
+        add_to_stats({(instance.book_id, 'review_count'): 1 if created else -1})
+    books_changed([instance.book_id])
+
+
+@receiver(pre_save, sender=Journal)
+def journal_saving(sender, instance, **kwargs):
+    # whether an edited entry was public, to count it in or out
+    if not instance._state.adding:
+        instance._was_public = Journal.objects.filter(id=instance.id, is_public=True).exists()
+
+
+@receiver(post_save, sender=Journal)
+@receiver(post_delete, sender=Journal)
+def journal_changed(sender, instance, created=False, **kwargs):
+    # the book page counts public journals
+    if kwargs['signal'] is post_delete:
+        counted = -instance.is_public
+    else:
+        counted = instance.is_public - (not created and getattr(instance, '_was_public', False))
+    add_to_stats({(instance.book_id, 'journal_count'): counted})
+    invalidate_pages([instance.book_id], parts=['details'])
+
+
+@receiver(m2m_changed, sender=Book.list.through)
+def book_lists_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # the book page counts readers and finishers, the rows leaving a list
+    # are only known before they are deleted
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_memberships = memberships(instance, reverse, pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        count_memberships(getattr(instance, '_removed_memberships', []), -1)
+    elif action == 'post_add':
+        count_memberships(memberships(instance, reverse, pk_set), 1)
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_pages([instance.id], parts=['details'])
+    elif action == 'pre_clear':
+        invalidate_pages(instance.list.values_list('id', flat=True), parts=['details'])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_pages(pk_set, parts=['details'])
+
+
+@receiver(pre_save, sender=List)
+def list_saving(sender, instance, **kwargs):
+    # the name and owner an edited list had, to move its counts
+    if not instance._state.adding:
+        instance._was = List.objects.filter(id=instance.id).values_list('name', 'user_id').first()
+
+
+@receiver(post_save, sender=List)
+@receiver(pre_delete, sender=List)
+def list_changed(sender, instance, created=False, **kwargs):
+    # a renamed or deleted list changes the counts of its books, renaming
+    # or deleting it doesn't send m2m_changed
+    if kwargs['signal'] is pre_delete:
+        instance._removed_memberships = memberships(instance, reverse=True)
+    elif not created:
+        was = getattr(instance, '_was', None)
+        if was and was != (instance.name, instance.user_id):
+            name, user_id = was
+            if name in LIST_FIELDS:
+                count_memberships([(book_id, name, user_id) for book_id in instance.list.values_list('id', flat=True)],
+                                  -1)
+            count_memberships(memberships(instance, reverse=True), 1)
+    if not created:
+        invalidate_pages(instance.list.values_list('id', flat=True), parts=['details'])
+
+
+@receiver(post_delete, sender=List)
+def list_deleted(sender, instance, **kwargs):
+    # the list's rows are gone now, uncount the readers they counted
+    count_memberships(getattr(instance, '_removed_memberships', []), -1)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # review pages show the username, logins only save last_login
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    invalidate_pages(Reviews.objects.filter(user=instance).values_list('book_id', flat=True), parts=['reviews'])
+
+
+@receiver(post_save, sender=Authors)
+def author_saved(sender, instance, created, **kwargs):
+    # a renamed author changes the vector, card and pages of every one of their books
+    if not created:
+        book_ids = list(instance.authors.values_list('id', flat=True))
+        update_search_vectors(book_ids)
+        books_changed(book_ids)
+
+
+def authors_changed(book_ids):
+    update_search_vectors(book_ids)
+    books_changed(book_ids)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            authors_changed([instance.id])
+    elif action == 'pre_clear':
+        # author.authors.clear() doesn't say which books lost the author
+        instance._cleared_book_ids = list(instance.authors.values_list('id', flat=True))
+    elif action == 'post_clear':
+        authors_changed(getattr(instance, '_cleared_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        authors_changed(pk_set)
+
+
+@receiver(m2m_changed, sender=Book.genres.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_pages([instance.id])
+    elif action == 'pre_clear':
+        invalidate_pages(instance.genres.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_pages(pk_set)
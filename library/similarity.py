@@ -0,0 +1,136 @@
+from django.conf import settings
+import numpy as np
+import logging
+
+logger = logging.getLogger('book_journal')
+
+
+def top_k(scores, k):
+    # indices of the k highest scores, best first, without sorting everything
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class ExactIndex:
+    """
+    brute force cosine similarity over the whole tfidf matrix.
+
+    rows are already l2 normalized by the vectorizer so a dot product is the
+    cosine similarity.
+    """
+
+    def __init__(self, matrix, book_ids):
+        self.matrix = matrix
+        self.book_ids = book_ids
+
+    def score(self, vector, k, exclude_rows=(), rows=None):
+        # exact scores for rows (all books when None), excluded rows never win
+        if rows is None:
+            scores = self.matrix.dot(vector)
+        else:
+            scores = self.matrix[rows].dot(vector)
+        scores = np.asarray(scores, dtype=np.float32).ravel()
+        if len(exclude_rows):
+            if rows is None:
+                scores[np.asarray(exclude_rows)] = -np.inf
+            else:
+                scores[np.isin(rows, exclude_rows)] = -np.inf
+        top = top_k(scores, k)
+        top = top[np.isfinite(scores[top])]
+        if rows is not None:
+            return rows[top], scores[top]
+        return top, scores[top]
+
+    def query_vector(self, vector, k, exclude_rows=()):
+        # top k rows for a query vector, as (rows, scores)
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return self.score(vector, k, exclude_rows)
+
+    def query(self, book_id, k=5):
+        # top k most similar books to book_id, as (book_ids, scores)
+        row = np.searchsorted(self.book_ids, book_id)
+        if row >= len(self.book_ids) or self.book_ids[row] != book_id:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        vector = self.matrix[row].toarray().ravel()
+        rows, scores = self.query_vector(vector, k, exclude_rows=[row])
+        return np.asarray(self.book_ids)[rows], scores
+
+
+class LSHIndex(ExactIndex):
+    """
+    random projection (sign) locality sensitive hashing for cosine similarity.
+
+    every table hashes a book to the signs of n_bits random hyperplanes. a
+    query only scores books that share a bucket with it in at least one table
+    (or differ by one bit, when probing neighbours), then ranks those exactly.
+    falls back to the exact scan when the buckets hold fewer than k books.
+    """
+
+    def __init__(self, matrix, book_ids, n_tables=8, n_bits=12, probe=True, seed=0):
+        super().__init__(matrix, book_ids)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probe = probe
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((matrix.shape[1], n_tables * n_bits)).astype(np.float32)
+        self.weights = (1 << np.arange(n_bits, dtype=np.int64))
+        codes = self.hash(matrix)
+        # per table: rows sorted by bucket code, bucket codes and their offsets
+        self.tables = []
+        for t in range(n_tables):
+            order = np.argsort(codes[:, t], kind='stable')
+            buckets, starts, counts = np.unique(codes[order, t], return_index=True, return_counts=True)
+            self.tables.append((order, buckets, starts, counts))
+        logger.debug(f'[LSH Index]: {matrix.shape[0]} books hashed into {n_tables} tables of {n_bits} bits')
+
+    def hash(self, vectors):
+        projected = vectors.dot(self.planes)
+        bits = np.asarray(projected > 0).reshape(-1, self.n_tables, self.n_bits)
+        return bits.astype(np.int64).dot(self.weights)
+
+    def candidates(self, vector):
+        codes = self.hash(vector.reshape(1, -1))[0]
+        flips = [0] + ([1 << b for b in range(self.n_bits)] if self.probe else [])
+        found = []
+        for t, (order, buckets, starts, counts) in enumerate(self.tables):
+            probes = np.array([codes[t] ^ flip for flip in flips], dtype=np.int64)
+            pos = np.searchsorted(buckets, probes)
+            hit = pos < len(buckets)
+            hit[hit] = buckets[pos[hit]] == probes[hit]
+            for p in pos[hit]:
+                found.append(order[starts[p]:starts[p] + counts[p]])
+        if not found:
+            return None
+        return np.unique(np.concatenate(found))
+
+    def query_vector(self, vector, k, exclude_rows=()):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        rows = self.candidates(vector)
+        if rows is not None:
+            top_rows, scores = self.score(vector, k, exclude_rows, rows)
+            if len(top_rows) >= k:
+                return top_rows, scores
+        # sparse buckets, answer exactly instead of returning too few books
+        return self.score(vector, k, exclude_rows)
+
+
+BACKENDS = {
+    'exact': ExactIndex,
+    'lsh': LSHIndex,
+}
+
+
+def build_index(matrix, book_ids, backend=None):
+    if backend is None:
+        backend = settings.RECOMMENDER_SIMILARITY_BACKEND
+    return BACKENDS[backend](matrix, book_ids)
+
+
+def get_index(model):
+    # the index lives as long as the loaded model, one per worker process
+    if getattr(model, 'index', None) is None:
+        model.index = build_index(model.matrix, model.book_ids)
+    return model.index
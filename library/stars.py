@@ -0,0 +1,36 @@
+import math
+
+# star ratings are shown to the half star: 3.7 is three and a half stars.
+# every pattern (0 to 10 half stars) and its markup is built once at import
+STAR_ICONS = {
+    'full': '<i class="fa-solid fa-star checked"></i>',
+    'half': '<i class="fa-solid fa-star-half-stroke checked"></i>',
+    'empty': '<i class="fa-regular fa-star"></i>',
+}
+PATTERNS = tuple(
+    tuple("full" if half_stars >= 2 * i else "half" if half_stars == 2 * i - 1 else "empty" for i in range(1, 6))
+    for half_stars in range(11)
+)
+PATTERN_HTML = tuple(''.join(STAR_ICONS[star] for star in pattern) for pattern in PATTERNS)
+
+
+def half_stars(rating):
+    # 0-10, None (no rating yet) shows empty stars
+    if rating is None:
+        return 0
+    return min(max(math.floor(rating * 2), 0), 10)
+
+
+def stars(rating):
+    """
+    the five stars of a rating.
+
+    returns:
+    - tuple of "full", "half" or "empty", one per star
+    """
+    return PATTERNS[half_stars(rating)]
+
+
+def stars_html(rating):
+    # the icons for the five stars of a rating
+    return PATTERN_HTML[half_stars(rating)]
@@ -0,0 +1,125 @@
+import random
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from library.models import Authors, Book, Genres, Reviews, User
+import numpy as np
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# catalog sizes used by the benchmarks, in books
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+GENRES = [
+    "Fiction", "Juvenile Fiction", "Science Fiction", "Fantasy", "History", "Biography & Autobiography",
+    "Young Adult Fiction", "Comics & Graphic Novels", "Poetry", "Religion", "Philosophy", "Science",
+    "Business & Economics", "Self-Help", "Cooking", "Travel", "Drama", "True Crime", "Social Science",
+    "Literary Criticism", "Political Science", "Psychology", "Art", "Music", "Mysteries and Thrillers",
+]
+WORDS = [
+    "the", "a", "of", "and", "in", "story", "stories", "novel", "novels", "war", "wars", "family", "families",
+    "journey", "journeys", "secrets", "history", "histories", "lives", "life", "kingdoms", "dragons", "children",
+    "cities", "women", "men", "love", "letters", "mysteries", "ships", "stars", "worlds", "machines", "memories",
+]
+FIRST_NAMES = [
+    "Ada", "Bram", "Clara", "Diego", "Edith", "Frank", "Grace", "Hugo", "Iris", "Jonah", "Kira", "Leo",
+    "Maya", "Nils", "Olive", "Pablo", "Quinn", "Rosa", "Sami", "Tess", "Ugo", "Vera", "Wes", "Yara",
+]
+LAST_NAMES = [
+    "Abbott", "Barros", "Chen", "Dubois", "Eriksen", "Fischer", "Garcia", "Haddad", "Ito", "Jensen", "Kowalski",
+    "Larsen", "Moreau", "Novak", "Okafor", "Petrov", "Quist", "Rossi", "Sato", "Tanaka", "Ueda", "Varga",
+]
+RATINGS = np.array([1, 2, 3, 3.5, 4, 4.5, 5], dtype=np.float32)
+RATING_WEIGHTS = np.array([0.05, 0.08, 0.17, 0.15, 0.25, 0.15, 0.15])
+
+
+def synthetic_corpus(n, text='genres', seed=42):
+    # genre (or genre + description) strings shaped like the recommender's input
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        genre_text = " ".join(rng.sample(GENRES, rng.randint(1, 3)))
+        if text == 'description':
+            genre_text = f'{genre_text} {" ".join(rng.choices(WORDS, k=40))}'
+        corpus.append(genre_text)
+    return corpus
+
+
+def synthetic_title(rng):
+    words = rng.choices(WORDS[5:], k=rng.randint(1, 4))
+    return ' '.join(word.capitalize() for word in ['the', *words])
+
+
+def generate_catalog(n_books, seed=0, ratings_per_user=20, batch_size=5000):
+    """
+    fill the database with a deterministic synthetic catalog.
+
+    parameters:
+    - n_books: number of books, authors and users scale with it (books/5, books/10)
+    - seed: the same seed always produces the same rows in the same order
+    - ratings_per_user: mean number of reviews per user, book popularity is zipf-like
+    - batch_size: rows per bulk_create
+
+    returns:
+    - dict of row counts by model
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+
+    genres = Genres.objects.bulk_create([Genres(genre=genre) for genre in GENRES])
+    authors = Authors.objects.bulk_create([
+        Authors(name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}')
+        for i in range(max(n_books // 5, 1))
+    ], batch_size=batch_size)
+
+    book_ids = []
+    genre_links = []
+    author_links = []
+    for start in range(0, n_books, batch_size):
+        batch = []
+        batch_genres = []
+        batch_authors = []
+        for i in range(start, min(start + batch_size, n_books)):
+            book_genres = rng.sample(genres, rng.randint(1, 3))
+            batch.append(Book(
+                title=synthetic_title(rng),
+                isbn=str(9780000000000 + i),
+                main_genre=book_genres[0],
+                description=' '.join(rng.choices(WORDS, k=40)),
+                page_count=rng.randint(80, 900),
+            ))
+            batch_genres.append(book_genres)
+            batch_authors.append(rng.sample(authors, 2 if rng.random() < 0.1 else 1))
+        Book.objects.bulk_create(batch)
+        for book, book_genres, book_authors in zip(batch, batch_genres, batch_authors):
+            book_ids.append(book.id)
+            genre_links.extend(Book.genres.through(book_id=book.id, genres_id=g.id) for g in book_genres)
+            author_links.extend(Book.authors.through(book_id=book.id, authors_id=a.id) for a in book_authors)
+        Book.genres.through.objects.bulk_create(genre_links, batch_size=batch_size)
+        Book.authors.through.objects.bulk_create(author_links, batch_size=batch_size)
+        genre_links, author_links = [], []
+
+    n_users = max(n_books // 10, 10)
+    users = User.objects.bulk_create([
+        User(username=f'reader{i}', email=f'reader{i}@example.com', password=UNUSABLE_PASSWORD_PREFIX)
+        for i in range(n_users)
+    ], batch_size=batch_size)
+
+    # every rating in one draw: book popularity falls off with a shuffled rank
+    counts = np.maximum(np_rng.poisson(ratings_per_user, n_users), 1)
+    popularity = 1 / (np_rng.permutation(n_books) + 10.0)
+    user_rows = np.repeat(np.arange(n_users), counts)
+    book_rows = np_rng.choice(n_books, len(user_rows), p=popularity / popularity.sum())
+    pairs = np.unique(user_rows.astype(np.int64) * n_books + book_rows)
+    ratings = np_rng.choice(RATINGS, len(pairs), p=RATING_WEIGHTS)
+    book_ids = np.asarray(book_ids, dtype=np.int64)
+    user_ids = np.array([user.id for user in users], dtype=np.int64)
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        Reviews.objects.bulk_create([
+            Reviews(user_id=int(user_ids[pair // n_books]), book_id=int(book_ids[pair % n_books]), rating=float(rating))
+            for pair, rating in zip(chunk, ratings[start:start + batch_size])
+        ])
+
+    counts = {'books': n_books, 'genres': len(genres), 'authors': len(authors), 'users': n_users, 'ratings': len(pairs)}
+    logger.info(f'[Synthetic]: generated {counts}')
+    return counts
@@ -0,0 +1,96 @@
+import threading
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from library.covers import ingest_covers
+from library.models import User
+from library.recommender import save_recommendations, user_recommendations
+import logging
+
+logger = logging.getLogger('book_journal')
+
+
+def pending_refresh_key(user_id):
+    return f'recommendations:pending:{user_id}'
+
+
+def run_later(delay, fn, *args):
+    # no worker: a timer thread of this process stands in for the countdown
+    def run():
+        try:
+            fn(*args)
+        finally:
+            # the thread's own database connection
+            connections.close_all()
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.start()
+
+
+def schedule_recommendation_refresh(user):
+    """
+    schedule a recommendation refresh for user unless one is already waiting.
+
+    the first review starts a RECOMMENDATION_REFRESH_DELAY window, reviews
+    posted inside the window are picked up by that same refresh. the pending
+    flag expires when the window ends instead of being cleared by the
+    refresh, so it works when the worker doesn't share the web process's
+    cache: reviews after the window always schedule the next refresh.
+
+    the refresh runs in the celery worker, or without one (BACKGROUND_TASKS
+    off) in a timer thread of the web process, never in the request.
+
+    returns:
+    - True if a refresh was scheduled, False if it was coalesced into one
+    """
+    delay = settings.RECOMMENDATION_REFRESH_DELAY
+    if not cache.add(pending_refresh_key(user.id), True, timeout=delay):
+        logger.debug(f'[Recommendations]: refresh for {user} already pending.')
+        return False
+    if settings.BACKGROUND_TASKS:
+        transaction.on_commit(lambda: refresh_user_recommendations.apply_async((user.id,), countdown=delay))
+    else:
+        transaction.on_commit(lambda: run_later(delay, refresh_user_recommendations, user.id))
+    logger.debug(f'[Recommendations]: refresh for {user} scheduled in {delay}s.')
+    return True
+
+
+@shared_task
+def refresh_user_recommendations(user_id):
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    book_ids, scores = user_recommendations(user)
+    logger.debug(f'RECS: {None if book_ids.size == 0 else book_ids}')
+    logger.debug(f'SCORES: {None if scores.size == 0 else scores}')
+    save_recommendations(user, book_ids, scores)
+    logger.info(f'[Recommendations]: updated for {user}.')
+
+
+def schedule_cover_ingest(book_ids):
+    # download covers once the books are committed, search results show the
+    # remote thumbnails meanwhile
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    if not settings.BACKGROUND_TASKS:
+        # no worker: the books stay pending, the next search page showing them
+        # downloads their covers (search_results.download_pending)
+        logger.debug(f'[Image Download]: no worker, leaving {len(book_ids)} covers pending.')
+        return
+    transaction.on_commit(lambda: ingest_book_covers.delay(book_ids))
+
+
+@shared_task(bind=True)
+def ingest_book_covers(self, book_ids, attempt=0):
+    retry = ingest_covers(book_ids)
+    if retry and self.request.is_eager:
+        # an eager retry would run at once, countdown ignored, inside the
+        # caller: leave the books pending for a later run instead
+        logger.info(f'[Image Download]: {len(retry)} covers left pending, eager tasks don\'t retry.')
+    elif retry:
+        # exponential backoff: COVER_RETRY_DELAY, then twice that, ...
+        delay = settings.COVER_RETRY_DELAY * 2 ** attempt
+        logger.info(f'[Image Download]: retrying {len(retry)} covers in {delay}s.')
+        ingest_book_covers.apply_async((retry, attempt + 1), countdown=delay)
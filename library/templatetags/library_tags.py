@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+from library.book_cards import book_card as cached_book_card
+from library.stars import stars_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def stars(rating):
+    # {% stars review.rating %}: five star icons, half stars included
+    return mark_safe(stars_html(rating))
+
+
+@register.simple_tag
+def book_card(book):
+    # {% book_card book %}: cover, title, authors and rating of a book, cached
+    return mark_safe(cached_book_card(book))
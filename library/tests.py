@@ -1,3 +1,775 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import numpy as np
+from scipy import sparse
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from library import autocomplete, batch, covers, google_books, normalize, recommender, tasks
+from library.fake_google_books import FakeGoogleBooksServer, fake_volume
+from library.importer import import_volumes, parse_volume
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from library.models import (Authors, Book, BookStats, BooksOwned, Covers, Genres, Journal, List, Reviews, Tags, User,
+                            UserFollow, UserRecommendations)
+from library.search import prefix_query, search_books
+from library.search_results import results_page
+from library.synthetic import generate_catalog
+from library.user_library import load_library, more_books
+from library.book_cards import attach_cards, book_card
+from library.book_pages import book_page
+from library.book_stats import rebuild_stats
+from library.stars import stars
 
-# Create your tests here.
+
+class RecommendationRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        self.old_book = Book.objects.create(title="Old Favourite", isbn="1")
+        self.new_book = Book.objects.create(title="New Favourite", isbn="2")
+        UserRecommendations.objects.create(user=self.user, book=self.old_book, score=0.5)
+
+    @override_settings(BACKGROUND_TASKS=True)
+    def test_quick_reviews_share_one_refresh(self):
+        with mock.patch.object(tasks.refresh_user_recommendations, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                queued = [tasks.schedule_recommendation_refresh(self.user) for _ in range(5)]
+        self.assertEqual(queued, [True, False, False, False, False])
+        self.assertEqual(apply_async.call_count, 1)
+
+    def test_refresh_without_worker_is_deferred_and_coalesced(self):
+        with mock.patch.object(tasks.refresh_user_recommendations, 'apply_async') as apply_async, \
+                mock.patch.object(tasks, 'run_later') as run_later:
+            with self.captureOnCommitCallbacks(execute=True):
+                queued = [tasks.schedule_recommendation_refresh(self.user) for _ in range(3)]
+        self.assertEqual(queued, [True, False, False])
+        apply_async.assert_not_called()
+        # nothing ran in the request, one timer does the refresh
+        run_later.assert_called_once_with(30, tasks.refresh_user_recommendations, self.user.id)
+        self.assertTrue(UserRecommendations.objects.filter(user=self.user).exists())
+
+    @override_settings(BACKGROUND_TASKS=True)
+    def test_worker_with_its_own_cache_never_blocks_refreshes(self):
+        web, worker = LocMemCache('web', {}), LocMemCache('worker', {})
+        now = time.time()
+        with mock.patch.object(tasks.refresh_user_recommendations, 'apply_async') as apply_async, \
+                mock.patch.object(tasks, 'user_recommendations', return_value=(np.array([]), np.array([]))):
+            with mock.patch.object(tasks, 'cache', web), self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(tasks.schedule_recommendation_refresh(self.user))
+            with mock.patch.object(tasks, 'cache', worker):
+                tasks.refresh_user_recommendations(self.user.id)
+            # once the window is over the next review schedules a refresh
+            with mock.patch.object(tasks, 'cache', web), self.captureOnCommitCallbacks(execute=True), \
+                    mock.patch('time.time', return_value=now + 31):
+                self.assertTrue(tasks.schedule_recommendation_refresh(self.user))
+        self.assertEqual(apply_async.call_count, 2)
+
+    @override_settings(BACKGROUND_TASKS=True)
+    def test_eager_refresh_replaces_recommendations(self):
+        recs = (np.array([self.new_book.id]), np.array([0.75], dtype=np.float32))
+        with mock.patch.object(tasks, 'user_recommendations', return_value=recs):
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.schedule_recommendation_refresh(self.user)
+        saved = list(UserRecommendations.objects.filter(user=self.user).values_list('book_id', 'score'))
+        self.assertEqual(saved, [(self.new_book.id, 0.75)])
+
+    def test_factor_model_first_then_content_based(self):
+        als = (np.array([self.new_book.id]), np.array([4.5], dtype=np.float32))
+        content = (np.array([self.old_book.id]), np.array([0.25], dtype=np.float32))
+        with mock.patch.object(recommender, 'content_based_recommendations', return_value=content), \
+                mock.patch.object(recommender, 'collaborative_recommendations', return_value=als):
+            self.assertEqual(recommender.user_recommendations(self.user), als)
+        with mock.patch.object(recommender, 'content_based_recommendations', return_value=content), \
+                mock.patch.object(recommender, 'load_factors', return_value=None):
+            self.assertEqual(recommender.user_recommendations(self.user), content)
+
+    def test_batch_clears_users_the_model_cant_score(self):
+        # the model was built before either book existed
+        Reviews.objects.create(user=self.user, book=self.new_book, rating=4)
+        model = mock.Mock(matrix=sparse.csr_matrix((1, 1), dtype=np.float32), book_ids=np.array([0]))
+        model.rows_for.side_effect = lambda book_ids: np.full(len(book_ids), -1)
+        with mock.patch.object(batch, 'get_model', return_value=model):
+            self.assertEqual(batch.refresh_all(), (1, 0))
+        self.assertFalse(UserRecommendations.objects.filter(user=self.user).exists())
+
+    def test_save_recommendations_is_one_bulk_write(self):
+        books = [Book.objects.create(title=f"Book {i}", isbn=str(10 + i)) for i in range(10)]
+        # savepoint + delete + insert + release, however many books
+        with self.assertNumQueries(4):
+            saved = recommender.save_recommendations(self.user, [b.id for b in books], np.linspace(1, 0, 10))
+        self.assertEqual(saved, 10)
+        self.assertEqual(
+            list(UserRecommendations.objects.filter(user=self.user).order_by('-score').values_list('book_id', flat=True)),
+            [b.id for b in books])
+
+
+class SyntheticCatalogTests(TestCase):
+    def snapshot(self):
+        return (
+            list(Book.objects.order_by('id').values_list('title', 'isbn', 'main_genre__genre', 'description')),
+            list(Reviews.objects.order_by('user__username', 'book__isbn').values_list(
+                'user__username', 'book__isbn', 'rating')),
+        )
+
+    def test_same_seed_generates_the_same_catalog(self):
+        counts = generate_catalog(200, seed=3)
+        self.assertEqual(counts['books'], Book.objects.count())
+        self.assertEqual(counts['ratings'], Reviews.objects.count())
+        first = self.snapshot()
+        for model in (Reviews, Book, User, Genres, Authors):
+            model.objects.all().delete()
+        generate_catalog(200, seed=3)
+        self.assertEqual(self.snapshot(), first)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.le_guin = Authors.objects.create(name="Ursula K. Le Guin")
+        self.other = Authors.objects.create(name="Someone Else")
+        self.title_hit = Book.objects.create(title="The Dispossessed", isbn="9780061054884")
+        self.author_hit = Book.objects.create(title="A Wizard of Earthsea", isbn="9780547773742")
+        self.author_hit.authors.set([self.le_guin, self.other])
+        self.description_hit = Book.objects.create(
+            title="Essays", isbn="9781", description="On reading The Dispossessed and other novels")
+        Book.objects.create(title="Unrelated", isbn="9782")
+
+    def test_title_ranks_above_author_above_description(self):
+        self.title_hit.authors.set([self.le_guin])
+        results = list(search_books("dispossessed"))
+        self.assertEqual(results, [self.title_hit, self.description_hit])
+        results = list(search_books("le guin"))
+        self.assertEqual(results, [self.title_hit, self.author_hit])
+
+    def test_books_with_several_matching_authors_appear_once(self):
+        self.other.name = "Ursula Someone"
+        self.other.save()
+        self.assertEqual(list(search_books("ursula")), [self.author_hit])
+
+    def test_isbn_match_comes_first(self):
+        self.assertEqual(list(search_books("9780547773742"))[0], self.author_hit)
+
+    def test_blank_query_finds_nothing(self):
+        self.assertEqual(list(search_books("   ")), [])
+
+    def test_prefix_query_keeps_only_words(self):
+        self.assertEqual(prefix_query("Harry Pott'er!"), "harry:* & pott:* & er:*")
+
+
+class SearchResultsTests(TestCase):
+    def setUp(self):
+        caches['google_books'].clear()
+        self.server = FakeGoogleBooksServer(results_per_query=5)
+        self.enterContext(self.server)
+        self.enterContext(override_settings(GOOGLE_BOOKS_API_URL=self.server.url))
+        self.local = [Book.objects.create(title=f"Earthsea {i}", isbn=str(i)) for i in range(5)]
+
+    def pages(self, query, page_size):
+        cursor = None
+        while True:
+            books, cursor = results_page(query, cursor, page_size)
+            yield books
+            if cursor is None:
+                return
+
+    def test_catalog_pages_come_before_the_api(self):
+        pages = self.pages("earthsea", 3)
+        self.assertEqual(next(pages), self.local[:3])
+        self.assertEqual(self.server.requests, [])
+        # the last catalog page is topped up from the first api page
+        second = next(pages)
+        self.assertEqual(second[:2], self.local[3:])
+        self.assertEqual(len(second), 3)
+        rest = list(pages)
+        self.assertEqual([len(page) for page in rest], [3, 1])
+        self.assertEqual(len(self.server.requests), 3)
+        # books imported by the api pages are not shown twice
+        shown = second + [book for page in rest for book in page]
+        self.assertEqual(len({book.id for book in shown}), len(shown))
+
+    def test_catalog_books_left_pending_get_their_covers(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        Book.objects.filter(id=self.local[0].id).update(
+            cover_status="pending", cover_image_url=f'{self.server.base_url}/covers/0.png')
+        book = results_page("earthsea", None, 3)[0][0]
+        self.assertEqual(book.cover_status, "fetched")
+        self.assertTrue(book.cover_url.startswith('/media/'))
+
+    def test_invalid_cursor_starts_over(self):
+        self.assertEqual(results_page("earthsea", "garbage", 3)[0], self.local[:3])
+        # a cursor only continues the search it was made for
+        _, cursor = results_page("earthsea", None, 3)
+        self.assertEqual([book.title for book in results_page("wizard", cursor, 3)[0]],
+                         [volume['volumeInfo']['title'] for volume in [fake_volume("wizard", i) for i in range(3)]])
+
+
+class GoogleBooksCacheTests(TestCase):
+    def setUp(self):
+        caches['google_books'].clear()
+        self.server = FakeGoogleBooksServer(results_per_query=3)
+        self.enterContext(self.server)
+        self.enterContext(override_settings(GOOGLE_BOOKS_API_URL=self.server.url))
+        self.breaker = google_books.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.enterContext(mock.patch.object(google_books, 'breaker', self.breaker))
+        self.enterContext(mock.patch.object(google_books, 'rate_limiter', google_books.TokenBucket(100, 100)))
+
+    def test_repeated_search_skips_the_network(self):
+        first = google_books.search_volumes("Le Guin")
+        again = google_books.search_volumes("  le   GUIN ")
+        self.assertEqual(len(first), 3)
+        self.assertEqual(again, first)
+        self.assertEqual(self.server.requests, ["le guin"])
+
+    def test_failed_search_is_not_cached(self):
+        self.server.status = 503
+        self.assertIsNone(google_books.search_volumes("earthsea"))
+        self.server.status = 200
+        self.assertEqual(len(google_books.search_volumes("earthsea")), 3)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_identical_searches_in_flight_share_one_request(self):
+        self.server.search_delay = 0.2
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(google_books.search_volumes, ["dune"] * 5))
+        self.assertEqual(self.server.requests, ["dune"])
+        self.assertTrue(all(result == results[0] and len(result) == 3 for result in results))
+
+    @override_settings(GOOGLE_BOOKS_READ_TIMEOUT=0.05)
+    def test_slow_upstream_times_out(self):
+        self.server.search_delay = 0.5
+        start = time.perf_counter()
+        self.assertIsNone(google_books.search_volumes("dune"))
+        self.assertLess(time.perf_counter() - start, 0.4)
+
+    def test_breaker_opens_then_retries_once(self):
+        self.server.status = 503
+        for query in ["a", "b", "c", "d"]:
+            self.assertIsNone(google_books.search_volumes(query))
+        # the third and fourth searches never reached the api
+        self.assertEqual(self.server.requests, ["a", "b"])
+        self.assertEqual(self.breaker.state, 'open')
+        self.breaker.opened_at -= 60
+        self.server.status = 200
+        self.assertEqual(len(google_books.search_volumes("e")), 3)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_client_errors_do_not_open_the_breaker(self):
+        self.server.status = 400
+        for query in ["a", "b", "c"]:
+            google_books.search_volumes(query)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_rate_limiter_refuses_past_the_burst(self):
+        with mock.patch.object(google_books, 'rate_limiter', google_books.TokenBucket(rate=0.01, capacity=2)):
+            results = [google_books.search_volumes(query) for query in ["a", "b", "c"]]
+        self.assertEqual([r is None for r in results], [False, False, True])
+        self.assertEqual(self.server.requests, ["a", "b"])
+
+    def test_cached_volumes_only_keep_what_the_import_reads(self):
+        volume = google_books.search_volumes("earthsea")[0]
+        self.assertEqual(set(volume), {'id', 'volumeInfo'})
+        self.assertEqual(volume['volumeInfo']['industryIdentifiers'][0]['type'], 'ISBN_13')
+
+
+class CoverDownloadTests(TestCase):
+    def setUp(self):
+        self.server = FakeGoogleBooksServer()
+        self.enterContext(self.server)
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.urls = {f'{self.server.base_url}/covers/{isbn}.png': str(isbn) for isbn in range(8)}
+
+    def test_downloads_run_concurrently_and_save_in_one_insert(self):
+        self.server.cover_delay = 0.3
+        start = time.perf_counter()
+        # existing covers lookup + one bulk insert
+        with self.assertNumQueries(2):
+            fetched = covers.fetch_covers(self.urls, workers=8)
+        self.assertLess(time.perf_counter() - start, 8 * 0.3)
+        self.assertEqual(set(fetched), set(self.urls))
+        self.assertEqual(Covers.objects.count(), 8)
+        self.assertTrue(all(cover.pk and cover.image.name for cover in fetched.values()))
+
+    def test_known_covers_are_not_downloaded_again(self):
+        covers.fetch_covers(self.urls)
+        fetched = covers.fetch_covers(self.urls)
+        self.assertEqual(len(self.server.covers), 8)
+        self.assertEqual(len(fetched), 8)
+
+    def test_failed_downloads_are_left_out(self):
+        missing = f'{self.server.base_url}/nothing-here.png'
+        fetched = covers.fetch_covers({missing: '1', **dict(list(self.urls.items())[:1])})
+        self.assertNotIn(missing, fetched)
+        self.assertEqual(Covers.objects.count(), 1)
+
+
+class CoverIngestTests(TestCase):
+    def setUp(self):
+        self.server = FakeGoogleBooksServer()
+        self.enterContext(self.server)
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory()),
+                                            COVER_MAX_ATTEMPTS=2))
+        cover_url = f'{self.server.base_url}/covers/1.png'
+        # two editions pointing at the same image
+        self.books = [Book.objects.create(title=f"Edition {i}", isbn=str(i), cover_image_url=cover_url,
+                                          cover_status="pending") for i in range(2)]
+        self.broken = Book.objects.create(title="Broken", isbn="3", cover_status="pending",
+                                          cover_image_url=f'{self.server.base_url}/missing.png')
+
+    def test_pending_books_show_the_remote_cover(self):
+        self.assertEqual(self.books[0].cover_url, self.books[0].cover_image_url)
+
+    def test_ingest_attaches_one_shared_cover(self):
+        covers.ingest_covers([b.id for b in self.books])
+        books = Book.objects.filter(id__in=[b.id for b in self.books])
+        self.assertEqual({b.cover_status for b in books}, {"fetched"})
+        self.assertEqual(len({b.thumbnail_cover_id for b in books}), 1)
+        self.assertEqual(len(self.server.covers), 1)
+        self.assertTrue(books[0].cover_url.startswith('/media/'))
+
+    def test_failed_downloads_back_off_then_give_up(self):
+        with mock.patch.object(tasks.ingest_book_covers, 'apply_async') as apply_async, \
+                override_settings(COVER_RETRY_DELAY=10):
+            tasks.ingest_book_covers([self.broken.id], attempt=0)
+        apply_async.assert_called_once_with(([self.broken.id], 1), countdown=10)
+        self.broken.refresh_from_db()
+        self.assertEqual((self.broken.cover_status, self.broken.cover_attempts), ("pending", 1))
+
+        self.assertEqual(covers.ingest_covers([self.broken.id]), [])
+        self.broken.refresh_from_db()
+        self.assertEqual((self.broken.cover_status, self.broken.cover_attempts), ("failed", 2))
+        self.assertEqual(self.broken.cover_url, self.broken.cover_image_url)
+
+    def test_ingest_drops_cached_pages(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.assertEqual(book_page('details', self.books[0].id)['cover_url'], self.books[0].cover_image_url)
+        covers.ingest_covers([self.books[0].id])
+        self.assertTrue(book_page('details', self.books[0].id)['cover_url'].startswith('/media/'))
+
+    def test_eager_ingest_does_not_chain_retries(self):
+        with override_settings(BACKGROUND_TASKS=True), self.captureOnCommitCallbacks(execute=True):
+            tasks.schedule_cover_ingest([self.broken.id])
+        self.broken.refresh_from_db()
+        self.assertEqual((self.broken.cover_status, self.broken.cover_attempts), ("pending", 1))
+
+    def test_no_worker_leaves_covers_pending(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tasks.schedule_cover_ingest([self.broken.id])
+        self.assertEqual(callbacks, [])
+        self.broken.refresh_from_db()
+        self.assertEqual((self.broken.cover_status, self.broken.cover_attempts), ("pending", 0))
+
+
+class NormalizeTests(TestCase):
+    def test_daemonic_processes_normalize_in_process(self):
+        daemon = mock.Mock(daemon=True)
+        with mock.patch('multiprocessing.current_process', return_value=daemon), \
+                mock.patch.object(normalize, 'ProcessPoolExecutor', side_effect=AssertionError), \
+                mock.patch.object(normalize, 'normalize_text', str.upper):
+            self.assertEqual(normalize.normalize_corpus(["books", "cats", "books"], workers=2, chunk_size=1),
+                             ["BOOKS", "CATS", "BOOKS"])
+
+
+class ImporterTests(TestCase):
+    def volumes(self, query, n):
+        return [fake_volume(query, i) for i in range(n)]
+
+    def test_query_count_does_not_grow_with_results(self):
+        with self.assertNumQueries(16):
+            few = import_volumes(self.volumes("small", 5))
+        with self.assertNumQueries(16):
+            many = import_volumes(self.volumes("large", 40))
+        self.assertEqual((len(few), len(many)), (5, 40))
+        book = many[0]
+        self.assertEqual(list(book.authors.values_list('name', flat=True)),
+                         self.volumes("large", 1)[0]['volumeInfo']['authors'])
+        self.assertEqual(book.genres.count(), 1)
+        self.assertEqual(book.cover_status, "pending")
+        self.assertIsNotNone(book.work_id)
+
+    def test_reimport_reuses_books_and_names(self):
+        first = import_volumes(self.volumes("again", 10))
+        authors = Authors.objects.count()
+        # existing books lookup, inside a savepoint
+        with self.assertNumQueries(3):
+            second = import_volumes(self.volumes("again", 10))
+        self.assertEqual([b.id for b in first], [b.id for b in second])
+        self.assertEqual(Book.objects.count(), 10)
+        self.assertEqual(Authors.objects.count(), authors)
+
+    def test_volumes_without_isbn_are_skipped(self):
+        volume = fake_volume("no isbn", 0)
+        del volume['volumeInfo']['industryIdentifiers']
+        self.assertEqual(import_volumes([volume]), [])
+
+    def test_parse_volume_normalizes_fields(self):
+        fields = parse_volume({
+            'industryIdentifiers': [{'type': 'ISBN_10', 'identifier': '0441013597'}],
+            'publishedDate': '1965-08',
+            'publisher': ['Chilton', 'Ace'],
+            'language': 'en',
+            'printType': 'BOOK',
+        })
+        self.assertEqual(fields['isbn'], '0441013597')
+        self.assertEqual(fields['published_date'], '1965-08-01')
+        self.assertEqual(fields['publisher'], 'Chilton, Ace')
+        self.assertEqual(fields['language'], 'en')
+        self.assertEqual(fields['print_type'], 'book')
+        self.assertEqual(fields['authors'], ["Unkown Author"])
+        self.assertEqual(parse_volume({'title': 'x' * 600})['title'], 'x' * 500)
+
+
+class LoadCatalogTests(TestCase):
+    def write_dump(self, lines):
+        f = tempfile.NamedTemporaryFile('wb', suffix='.jsonl.gz', delete=False)
+        self.addCleanup(os.remove, f.name)
+        with gzip.open(f, 'wt') as dump:
+            dump.writelines(f'{line}\n' for line in lines)
+        return f.name
+
+    def test_load_catalog_streams_batches(self):
+        volumes = [fake_volume("dump", i) for i in range(25)]
+        no_isbn = fake_volume("dump", 99)['volumeInfo']
+        del no_isbn['industryIdentifiers']
+        # wrapped and bare volumeInfo lines, a repeat, a blank line
+        lines = [json.dumps(v) for v in volumes[:10]] + [json.dumps(v['volumeInfo']) for v in volumes[10:]]
+        path = self.write_dump(lines + [json.dumps(volumes[0]), '', json.dumps(no_isbn)])
+        call_command('load_catalog', path, batch_size=7, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Book.objects.count(), 25)
+        book = Book.objects.get(isbn=parse_volume(volumes[12]['volumeInfo'])['isbn'])
+        self.assertEqual(list(book.authors.values_list('name', flat=True)), volumes[12]['volumeInfo']['authors'])
+        self.assertIsNotNone(book.work_id)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.clear_cache()
+        self.addCleanup(autocomplete.clear_cache)
+        for i, title in enumerate(["Dune", "Dune", "Dune Messiah", "Children of Dune", "Emma"]):
+            book = Book.objects.create(title=title, isbn=str(i), ratings_count=i)
+            book.authors.add(Authors.objects.get_or_create(name="Frank Herbert" if "Dune" in title else "Jane Austen")[0])
+        Authors.objects.create(name="Dunsany")
+        User.objects.create(username="dune_fan", is_public=True)
+        User.objects.create(username="dune_secret", is_public=False)
+
+    def labels(self, query, **kwargs):
+        return [s['label'] for s in autocomplete.suggest(query, **kwargs)]
+
+    def test_titles_then_authors(self):
+        # prefix matches by popularity, repeated titles once, then contains matches
+        self.assertEqual(self.labels("dun"), ["Dune Messiah", "Dune", "Children of Dune", "Dunsany"])
+        self.assertEqual(self.labels("DU", limit=2), ["Dune Messiah", "Dunsany"])
+        self.assertEqual(self.labels("d"), [])
+
+    def test_users_are_public_only(self):
+        self.assertEqual(self.labels("@dune"), ["@dune_fan"])
+
+    def test_hot_prefixes_skip_the_database(self):
+        first = autocomplete.suggest("dune")
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest(" Dune"), first)
+        # longer prefixes always hit the indexes: title prefix, title contains, author prefix
+        with self.assertNumQueries(3):
+            autocomplete.suggest("dune m")
+
+    def test_endpoint(self):
+        response = self.client.get("/search/autocomplete", {"q": "emm"})
+        self.assertEqual(response.json()["suggestions"][0],
+                         {"type": "book", "label": "Emma", "url": f"/books/{Book.objects.get(title='Emma').id}/"})
+
+    def test_author_links_encode_the_name(self):
+        Authors.objects.create(name="Smith & Jones")
+        suggestion = autocomplete.suggest("smith")[0]
+        self.assertEqual(suggestion["url"], "/?query=Smith+%26+Jones")
+
+
+@override_settings(LIBRARY_LIST_LIMIT=3)
+class UserLibraryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="collector")
+        self.books = [Book.objects.create(title=f"Shelf {i:02}", isbn=f"shelf-{i}") for i in range(8)]
+        self.finished = List.objects.create(user=self.user, name="Finished")
+        for book in self.books:
+            book.list.add(self.finished)
+        Reviews.objects.create(user=self.user, book=self.books[0], rating=3.5)
+
+    def test_queries_do_not_grow_with_lists(self):
+        # five queries plus one for the authors of the cards not cached yet
+        cache.clear()
+        with self.assertNumQueries(6):
+            load_library(self.user)
+        for i in range(10):
+            self.books[i % 8].list.add(List.objects.create(user=self.user, name=f"Custom {i}"))
+        load_library(self.user)
+        with self.assertNumQueries(5):
+            data = load_library(self.user)
+        self.assertEqual(len(data['lists']), 11)
+
+    def test_lists_are_limited_and_load_more(self):
+        data = load_library(self.user)
+        finished = data['lists'][0]
+        self.assertEqual((finished.book_count, finished.books), (8, self.books[:3]))
+        self.assertEqual(more_books(finished, 3), (self.books[3:6], 6))
+        self.assertEqual(more_books(finished, 6), (self.books[6:], None))
+        self.assertEqual(data['need_reviews'], self.books[1:4])
+        self.assertEqual(data['reviews'][0].rating, 3.5)
+
+
+class BookCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = Authors.objects.create(name="Ursula K. Le Guin")
+        self.book = Book.objects.create(title="The Lathe of Heaven", isbn="1", average_rating=4.25)
+        self.book.authors.add(self.author)
+
+    def card(self):
+        return attach_cards([Book.objects.get(id=self.book.id)])[0].card_html
+
+    def test_stars_table_matches_half_star_rounding(self):
+        for rating in [0, 0.4, 0.5, 1, 2.49, 2.5, 3.7, 4.99, 5, 7, -1]:
+            expected = tuple("full" if rating >= i else "half" if rating >= i - 0.5 else "empty" for i in range(1, 6))
+            self.assertEqual(stars(rating), expected, rating)
+        self.assertEqual(stars(None), ("empty",) * 5)
+
+    def test_cards_are_rendered_once(self):
+        card = self.card()
+        self.assertIn("The Lathe of Heaven by Ursula K. Le Guin (4.3&#9733;)", card)
+        books = [Book.objects.get(id=self.book.id)]
+        with self.assertNumQueries(0):
+            attach_cards(books)
+            self.assertEqual(book_card(books[0]), card)
+
+    def test_changes_drop_the_card(self):
+        self.card()
+        self.book.title = "The Lathe of Heaven (Reissue)"
+        self.book.save()
+        self.assertIn("(Reissue)", self.card())
+        self.book.authors.add(Authors.objects.create(name="Someone Else"))
+        self.assertIn("Someone Else", self.card())
+        cover = Covers.objects.create(image="book_covers/lathe.png")
+        Book.objects.filter(id=self.book.id).update(thumbnail_cover=cover)
+        cover.image = "book_covers/lathe-2.png"
+        cover.save()
+        self.assertIn("lathe-2.png", self.card())
+        Book.objects.filter(id=self.book.id).update(average_rating=1.5)
+        Reviews.objects.create(book=self.book, user=User.objects.create(username="critic"), rating=1.5)
+        self.assertIn("(1.5&#9733;)", self.card())
+
+
+class BookPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create(username="reader")
+        self.reading = List.objects.create(user=self.user, name="Currently Reading")
+        self.book = Book.objects.create(title="Middlemarch", isbn="1", average_rating=4.0, ratings_count=1)
+        self.book.authors.add(Authors.objects.create(name="George Eliot"))
+        self.review = Reviews.objects.create(book=self.book, user=User.objects.create(username="critic"), rating=4)
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        return self.client.get(url).content.decode()
+
+    def test_warm_pages_only_load_the_user_parts(self):
+        self.get(f"/books/{self.book.id}/")
+        self.get(f"/reviews/book/{self.book.id}")
+        # session, user, then the user's lists for the dropdown and its selection
+        with self.assertNumQueries(4):
+            self.assertIn("George Eliot", self.get(f"/books/{self.book.id}/"))
+        with self.assertNumQueries(2):
+            self.assertIn("@critic", self.get(f"/reviews/book/{self.book.id}"))
+
+    def test_changes_drop_the_pages(self):
+        self.assertNotIn("Currently Reading: ", self.get(f"/books/{self.book.id}/"))
+        self.book.list.add(self.reading)
+        page = self.get(f"/books/{self.book.id}/")
+        self.assertIn("<strong>Currently Reading: </strong>1", page)
+        self.assertIn("Add Journal Entry", page)
+        Journal.objects.create(user=self.user, book=self.book, page=1, is_public=True)
+        self.assertIn(f'<a href="/journals/book/{self.book.id}">1</a>', self.get(f"/books/{self.book.id}/"))
+
+        self.get(f"/reviews/book/{self.book.id}")
+        self.review.user.username = "reviewer"
+        self.review.user.save()
+        self.assertIn("@reviewer", self.get(f"/reviews/book/{self.book.id}"))
+        Reviews.objects.create(book=self.book, user=self.user, rating=2, title="Too long")
+        self.assertIn("Too long", self.get(f"/reviews/book/{self.book.id}"))
+
+
+class BookStatsTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Beloved", isbn="1")
+        self.users = [User.objects.create(username=f"reader{i}") for i in range(3)]
+        self.lists = {(user.id, name): List.objects.create(user=user, name=name)
+                      for user in self.users for name in ["Currently Reading", "Finished", "To Be Read"]}
+
+    def stats(self):
+        row = BookStats.objects.get(book=self.book)
+        return row.journal_count, row.reader_count, row.finished_count, row.review_count
+
+    def test_counters_follow_writes(self):
+        self.book.list.add(*[self.lists[user.id, "Currently Reading"] for user in self.users])
+        self.book.list.add(self.lists[self.users[0].id, "To Be Read"])
+        self.assertEqual(self.stats(), (0, 3, 0, 0))
+        # finishing the book, like books() and new_journal do
+        self.book.list.remove(self.lists[self.users[0].id, "Currently Reading"])
+        self.lists[self.users[0].id, "Finished"].list.add(self.book)
+        # removing a book from a list it isn't in changes nothing
+        self.book.list.remove(self.lists[self.users[1].id, "Finished"])
+        self.assertEqual(self.stats(), (0, 2, 1, 0))
+        journal = Journal.objects.create(user=self.users[0], book=self.book, page=1, is_public=True)
+        Journal.objects.create(user=self.users[1], book=self.book, page=1, is_public=False)
+        journal.save()
+        self.assertEqual(self.stats(), (1, 2, 1, 0))
+        journal.is_public = False
+        journal.save()
+        review = Reviews.objects.create(user=self.users[0], book=self.book, rating=5)
+        self.assertEqual(self.stats(), (0, 2, 1, 1))
+        review.delete()
+        self.lists[self.users[2].id, "Currently Reading"].delete()
+        self.assertEqual(self.stats(), (0, 1, 1, 0))
+
+    def test_users_with_two_same_named_lists_count_once(self):
+        second = List.objects.create(user=self.users[0], name="Currently Reading")
+        self.book.list.add(self.lists[self.users[0].id, "Currently Reading"], second)
+        self.assertEqual(self.stats(), (0, 1, 0, 0))
+        second.delete()
+        self.assertEqual(self.stats(), (0, 1, 0, 0))
+        self.book.list.clear()
+        self.assertEqual(self.stats(), (0, 0, 0, 0))
+        self.book.list.add(self.lists[self.users[0].id, "Currently Reading"])
+        second = List.objects.create(user=self.users[0], name="Currently Reading")
+        second.list.add(self.book)
+        self.assertEqual(self.stats(), (0, 1, 0, 0))
+        # a reconcile agrees with the live counters
+        self.assertEqual(rebuild_stats()[1], [])
+
+    def test_renamed_lists_move_their_counts(self):
+        reading = self.lists[self.users[0].id, "Currently Reading"]
+        to_read = self.lists[self.users[1].id, "To Be Read"]
+        self.book.list.add(reading, to_read)
+        reading.name = "Finished"
+        reading.save()
+        self.assertEqual(self.stats(), (0, 0, 1, 0))
+        to_read.name = "Currently Reading"
+        to_read.save()
+        self.assertEqual(self.stats(), (0, 1, 1, 0))
+        # users[0] already had the book in their other "Finished" list
+        self.book.list.add(self.lists[self.users[0].id, "Finished"])
+        reading.name = "Favourites"
+        reading.save()
+        self.assertEqual(self.stats(), (0, 1, 1, 0))
+        self.assertEqual(rebuild_stats()[1], [])
+
+    def test_book_page_shows_the_review_counter(self):
+        Book.objects.filter(id=self.book.id).update(average_rating=5, ratings_count=9)
+        Reviews.objects.create(user=self.users[0], book=self.book, rating=5)
+        self.assertIn('<p class="rating-element">(1)</p>', book_page('reviews', self.book.id)['html'])
+
+    def test_reconcile_rebuilds_counters(self):
+        self.book.list.add(self.lists[self.users[0].id, "Finished"])
+        Reviews.objects.create(user=self.users[0], book=self.book, rating=5)
+        BookStats.objects.filter(book=self.book).update(finished_count=7, reader_count=-1)
+        BookStats.objects.create(book=Book.objects.create(title="Sula", isbn="2"), journal_count=2)
+        call_command('reconcile_book_stats', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.stats(), (0, 0, 1, 1))
+        self.assertEqual(BookStats.objects.count(), 1)
+
+
+class PageQueryBudgetTests(TestCase):
+    # queries per page, the same for every number of books, reviews and journals.
+    # pages with book cards make one query for the authors of uncached cards
+    BUDGETS = {
+        'home': 5,
+        'search': 7,
+        'library': 8,
+        'library_list': 5,
+        'journal': 5,
+        'book': 7,
+        'book_reviews': 6,
+        'review': 5,
+        'book_journal': 6,
+        'book_journals': 6,
+        'profile': 12,
+        'autocomplete': 3,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(username="reader", is_public=True)
+        self.other = User.objects.create(username="writer", is_public=True)
+        for user in [self.user, self.other]:
+            for name in ["Currently Reading", "To Be Read", "Finished"]:
+                List.objects.create(user=user, name=name)
+        self.book = self.add_book(0)
+        self.seed(range(1, 3))
+        self.client.force_login(self.user)
+        server = self.enterContext(FakeGoogleBooksServer(results_per_query=0))
+        self.enterContext(override_settings(GOOGLE_BOOKS_API_URL=server.url))
+        caches['google_books'].clear()
+        autocomplete.clear_cache()
+
+    def add_book(self, i):
+        book = Book.objects.create(title=f"Seeded {i}", isbn=f"seed-{i}", ratings_count=1, average_rating=4.5,
+                                   thumbnail_cover=Covers.objects.create(image=f"book_covers/{i}.png"))
+        book.authors.add(Authors.objects.create(name=f"Author {i}"))
+        book.genres.add(Genres.objects.create(genre=f"Genre {i}"))
+        return book
+
+    def seed(self, numbers):
+        # every row the pages list grows: books in every list, reviews,
+        # journals with tags, owned books, recommendations, followers
+        for i in numbers:
+            book = self.add_book(i)
+            book.list.add(*List.objects.filter(user=self.user))
+            Reviews.objects.create(book=book, user=self.user, rating=i % 5)
+            Reviews.objects.create(book=self.book, user=self.other, rating=i % 5)
+            for author, journal_book in [(self.user, book), (self.other, self.book)]:
+                journal = Journal.objects.create(user=author, book=journal_book, page=i, is_public=True)
+                journal.tags.add(*[Tags.objects.get_or_create(tag=f"tag {i % 3 + t}")[0] for t in range(2)])
+            BooksOwned.objects.create(user=self.user, book=book)
+            UserRecommendations.objects.create(user=self.user, book=book, score=0.5)
+            follower = User.objects.create(username=f"follower{i}")
+            UserFollow.objects.create(follower=follower, followed=self.user)
+
+    def pages(self):
+        review = Reviews.objects.filter(book=self.book).first()
+        journal = Journal.objects.filter(book=self.book).first()
+        return {
+            'home': "/",
+            'search': "/?query=seeded",
+            'library': "/library/",
+            'library_list': f"/library/lists/{List.objects.get(user=self.user, name='Finished').id}/?start=1",
+            'journal': "/journal/",
+            'book': f"/books/{self.book.id}/",
+            'book_reviews': f"/reviews/book/{self.book.id}",
+            'review': f"/reviews/{review.id}",
+            'book_journal': f"/journal/{journal.id}",
+            'book_journals': f"/journals/book/{self.book.id}/",
+            'profile': "/profile/@reader/",
+            'autocomplete': "/search/autocomplete?q=seeded",
+        }
+
+    def count_queries(self):
+        counts = {}
+        for name, url in self.pages().items():
+            # cold caches: every card is rendered
+            autocomplete.clear_cache()
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        few = self.count_queries()
+        self.seed(range(3, 9))
+        self.assertEqual(self.count_queries(), few)
+        self.assertEqual(few, self.BUDGETS)
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.db.models import Count, Prefetch
+from library.book_cards import attach_cards
+from library.models import Book, BooksOwned, Journal, List, Reviews
+
+# how the books of a list are shown, the first page and "load more" pages agree
+LIST_ORDER = ['title', 'id']
+
+
+def list_books():
+    return Book.objects.select_related('thumbnail_cover').order_by(*LIST_ORDER)
+
+
+def user_lists(user, books_per_list=None):
+    """
+    the lists of user, each with book_count and its first books.
+
+    parameters:
+    - books_per_list: books loaded per list, LIBRARY_LIST_LIMIT by default
+
+    returns:
+    - List queryset, every List has .book_count and .books (covers joined),
+      two queries however many lists there are
+    """
+    books_per_list = books_per_list or settings.LIBRARY_LIST_LIMIT
+    # a sliced prefetch limits every list on its own (window function)
+    return (List.objects.filter(user=user).order_by('created_at', 'id').annotate(book_count=Count('list'))
+            .prefetch_related(Prefetch('list', queryset=list_books()[:books_per_list], to_attr='books')))
+
+
+def more_books(lst, start, limit=None):
+    """
+    the books of lst after the first start, for "load more".
+
+    returns:
+    - (list of Books, start of the next page or None after the last one)
+    """
+    limit = limit or settings.LIBRARY_LIST_LIMIT
+    books = list(list_books().filter(list=lst)[start:start + limit + 1])
+    if len(books) <= limit:
+        return books, None
+    return books[:limit], start + limit
+
+
+def load_library(user, profile=False):
+    """
+    everything the library and profile pages show about user, in a fixed
+    number of queries.
+
+    parameters:
+    - profile: for the public profile page: only what other users may see
+      (public journals, approved reviews) and owned books instead of review
+      prompts
+
+    returns:
+    - dict with
+      - lists: see user_lists
+      - reviews: latest Reviews first, book covers joined
+      - journals: latest Journal entries, book covers joined
+      - owned_books: Books the user owns, empty unless profile
+      - need_reviews: finished Books the user hasn't reviewed, empty for a profile
+    """
+    reviews = Reviews.objects.filter(user=user).select_related('book__thumbnail_cover').order_by('-created_at', '-id')
+    journals = Journal.objects.filter(user=user).select_related('book__thumbnail_cover').order_by('-created_at', '-id')
+    owned_books = need_reviews = []
+    if profile:
+        reviews = reviews.filter(is_approved=True)
+        journals = journals.filter(is_public=True)
+        owned_books = [owned.book for owned in BooksOwned.objects.filter(user=user).select_related(
+            'book__thumbnail_cover').order_by('-id')[:settings.LIBRARY_LIST_LIMIT]]
+    else:
+        need_reviews = list(list_books().filter(list__user=user, list__name="Finished").exclude(
+            reviews__user=user)[:settings.LIBRARY_LIST_LIMIT])
+    lists = list(user_lists(user))
+    reviews = list(reviews[:settings.LIBRARY_REVIEWS_LIMIT])
+    journals = list(journals[:settings.LIBRARY_JOURNALS_LIMIT])
+    # every card of the page in one cache round trip
+    attach_cards([book for lst in lists for book in lst.books] + need_reviews + owned_books
+                 + [review.book for review in reviews] + [journal.book for journal in journals])
+    return {
+        'lists': lists,
+        'reviews': reviews,
+        'journals': journals,
+        'owned_books': owned_books,
+        'need_reviews': need_reviews,
+    }
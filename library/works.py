@@ -0,0 +1,188 @@
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from library.models import Book, Works
+import numpy as np
+import logging
+
+logger = logging.getLogger('book_journal')
+
+# words describing an edition rather than the work itself
+EDITION_WORDS = {
+    'edition', 'editions', 'anniversary', 'illustrated', 'deluxe', 'unabridged', 'abridged', 'revised',
+    'expanded', 'collector', 'collectors', 'paperback', 'hardcover', 'annotated', 'reissue', 'movie', 'tie',
+}
+ARTICLES = {'the', 'a', 'an'}
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'phd', 'md'}
+UNKNOWN_AUTHORS = {'unknown author', 'unkown author'}
+
+# minhash signature = BANDS bands of ROWS hashes; two titles land in the same
+# bucket of some band with high probability once their jaccard is above ~0.6
+BANDS = 8
+ROWS = 4
+PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240101)
+_A = _rng.integers(1, PRIME, BANDS * ROWS, dtype=np.int64)
+_B = _rng.integers(0, PRIME, BANDS * ROWS, dtype=np.int64)
+
+# shingle jaccard needed to call two titles by the same authors one work
+SIMILARITY = 0.7
+
+
+def ascii_lower(text):
+    return unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+
+
+def title_key(title):
+    # "The Hobbit: 75th Anniversary Edition" -> "hobbit"
+    title = ascii_lower(title).replace('&', ' and ')
+    main = re.split(r'[:;(\[]| - ', title)[0]
+    words = re.findall(r'[a-z0-9]+', main) or re.findall(r'[a-z0-9]+', title)
+    words = [word for word in words if word not in EDITION_WORDS]
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return ' '.join(words)
+
+
+def author_key(names):
+    # "Tolkien, J. R. R." and "J.R.R. Tolkien" -> "tolkien"
+    surnames = set()
+    for name in names:
+        name = ascii_lower(name).strip()
+        if not name or name in UNKNOWN_AUTHORS:
+            continue
+        if ',' in name:
+            words = re.findall(r'[a-z0-9]+', name.split(',')[0])
+        else:
+            words = [word for word in re.findall(r'[a-z0-9]+', name) if word not in NAME_SUFFIXES]
+        if words:
+            surnames.add(words[-1])
+    return ' '.join(sorted(surnames))
+
+
+def shingles(key, k=3):
+    if len(key) <= k:
+        return {key}
+    return {key[i:i + k] for i in range(len(key) - k + 1)}
+
+
+def minhash(shingle_set):
+    hashes = np.array([zlib.crc32(s.encode()) % PRIME for s in shingle_set], dtype=np.int64)
+    return ((np.outer(hashes, _A) + _B) % PRIME).min(axis=0)
+
+
+def same_work(a, b):
+    # numbers distinguish volumes of a series ("volume 1" vs "volume 2")
+    if a[0] == b[0]:
+        return True
+    if set(re.findall(r'\d+', a[0])) != set(re.findall(r'\d+', b[0])):
+        return False
+    return len(a[1] & b[1]) / len(a[1] | b[1]) >= SIMILARITY
+
+
+def cluster(items):
+    """
+    group items into works.
+
+    parameters:
+    - items: list of (title_key, author_key) tuples
+
+    returns:
+    - a list with the cluster number of every item
+
+    items are only compared within the same author_key, and within an author
+    only when their minhash signatures share a band bucket, so the number of
+    comparisons stays close to linear.
+    """
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    by_author = defaultdict(list)
+    for i, (_, author) in enumerate(items):
+        by_author[author].append(i)
+    for members in by_author.values():
+        # identical keys are the same work without comparing anything
+        first_of_key = {}
+        for i in members:
+            key = items[i][0]
+            if key in first_of_key:
+                parent[i] = first_of_key[key]
+            else:
+                first_of_key[key] = i
+        if len(first_of_key) < 2:
+            continue
+        prepared = {i: (key, shingles(key)) for key, i in first_of_key.items()}
+        buckets = defaultdict(list)
+        for i, (_, shingle_set) in prepared.items():
+            signature = minhash(shingle_set)
+            for band in range(BANDS):
+                buckets[(band, signature[band * ROWS:(band + 1) * ROWS].tobytes())].append(i)
+        for bucket in buckets.values():
+            for pos, i in enumerate(bucket):
+                for j in bucket[pos + 1:]:
+                    if find(i) != find(j) and same_work(prepared[i], prepared[j]):
+                        parent[find(i)] = find(j)
+    return [find(i) for i in range(len(items))]
+
+
+def book_keys(book_ids=None):
+    # (book_id, title_key, author_key) for the given books, two queries
+    books = Book.objects.order_by('id')
+    links = Book.authors.through.objects.all()
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+        links = links.filter(book_id__in=book_ids)
+    names = defaultdict(list)
+    for book_id, name in links.values_list('book_id', 'authors__name').iterator(chunk_size=20000):
+        names[book_id].append(name)
+    return [(book_id, title_key(title), author_key(names.get(book_id, [])))
+            for book_id, title in books.values_list('id', 'title').iterator(chunk_size=20000)]
+
+
+def assign_works(book_ids=None):
+    """
+    set Book.work for the given books (every book when None), reusing an
+    existing work with the same authors when the titles match.
+
+    returns:
+    - number of books assigned
+    """
+    keys = book_keys(book_ids)
+    if not keys:
+        return 0
+    existing = list(Works.objects.filter(author_key__in={author for _, _, author in keys}))
+    items = [(work.title_key, work.author_key) for work in existing] + [(title, author) for _, title, author in keys]
+    clusters = cluster(items)
+    # each cluster keeps an existing work if it has one, otherwise gets a new one
+    cluster_work = {}
+    for work, c in zip(existing, clusters):
+        cluster_work.setdefault(c, work)
+    new_works = {}
+    for (_, title, author), c in zip(keys, clusters[len(existing):]):
+        if c not in cluster_work and c not in new_works:
+            new_works[c] = Works(title_key=title, author_key=author)
+    Works.objects.bulk_create(new_works.values(), batch_size=1000)
+    cluster_work.update(new_works)
+    books = [Book(id=book_id, work=cluster_work[c]) for (book_id, _, _), c in zip(keys, clusters[len(existing):])]
+    Book.objects.bulk_update(books, ['work'], batch_size=1000)
+    logger.info(f'[Works]: {len(books)} books assigned, {len(new_works)} new works')
+    return len(books)
+
+
+def dedupe_by_work(books):
+    # keep the first edition of every work, books without a work are kept
+    seen = set()
+    unique = []
+    for book in books:
+        if book.work_id is not None:
+            if book.work_id in seen:
+                continue
+            seen.add(book.work_id)
+        unique.append(book)
+    return unique
@@ -0,0 +1,34 @@
+// search-as-you-type: fill the search box datalist from /search/autocomplete
+(function () {
+	const form = document.querySelector('.search-form[data-autocomplete-url]');
+	if (!form) {
+		return;
+	}
+	const input = form.querySelector('.search-input');
+	const list = document.getElementById('search-suggestions');
+	let timer = null;
+	let controller = null;
+
+	input.addEventListener('input', function () {
+		clearTimeout(timer);
+		// wait for a pause in typing, and drop the answer to an older prefix
+		timer = setTimeout(function () {
+			if (controller) {
+				controller.abort();
+			}
+			controller = new AbortController();
+			const url = form.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value);
+			fetch(url, {signal: controller.signal})
+				.then(function (response) { return response.json(); })
+				.then(function (data) {
+					list.replaceChildren(...data.suggestions.map(function (suggestion) {
+						const option = document.createElement('option');
+						option.value = suggestion.label;
+						option.label = suggestion.type;
+						return option;
+					}));
+				})
+				.catch(function () {});
+		}, 120);
+	});
+})();